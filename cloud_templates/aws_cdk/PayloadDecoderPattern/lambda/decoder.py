@@ -0,0 +1,98 @@
+import base64
+import json
+import os
+import struct
+
+# Key dictionary shared with the device encoder, index i is sent for key i
+PAYLOAD_KEYS = [key for key in os.environ.get("PAYLOAD_KEYS", "").split(",") if key]
+REPUBLISH_TOPIC_PREFIX = os.environ.get("REPUBLISH_TOPIC_PREFIX", "decoded")
+
+# created on first use, so the decoder itself can be imported without boto3
+iot_data = None
+
+
+class CborDecoder:
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def _take(self, count):
+        if self.pos + count > len(self.data):
+            raise ValueError("truncated CBOR payload")
+        chunk = self.data[self.pos:self.pos + count]
+        self.pos += count
+        return chunk
+
+    def _argument(self, info):
+        if info < 24:
+            return info
+        if info == 24:
+            return self._take(1)[0]
+        if info == 25:
+            return struct.unpack(">H", self._take(2))[0]
+        if info == 26:
+            return struct.unpack(">I", self._take(4))[0]
+        if info == 27:
+            return struct.unpack(">Q", self._take(8))[0]
+        raise ValueError("indefinite length CBOR items are not supported")
+
+    def decode(self):
+        initial = self._take(1)[0]
+        major = initial >> 5
+        info = initial & 0x1f
+        if major == 7:
+            if info == 20:
+                return False
+            if info == 21:
+                return True
+            if info == 22 or info == 23:
+                return None
+            if info == 25:
+                return struct.unpack(">e", self._take(2))[0]
+            if info == 26:
+                return struct.unpack(">f", self._take(4))[0]
+            if info == 27:
+                return struct.unpack(">d", self._take(8))[0]
+            raise ValueError(f"unsupported CBOR simple value {info}")
+        value = self._argument(info)
+        if major == 0:
+            return value
+        if major == 1:
+            return -1 - value
+        if major == 2:
+            return base64.b64encode(self._take(value)).decode("ascii")
+        if major == 3:
+            return self._take(value).decode("utf-8")
+        if major == 4:
+            return [self.decode() for _ in range(value)]
+        if major == 5:
+            result = {}
+            for _ in range(value):
+                key = self.decode()
+                if isinstance(key, int) and 0 <= key < len(PAYLOAD_KEYS):
+                    key = PAYLOAD_KEYS[key]
+                result[str(key)] = self.decode()
+            return result
+        # major type 6, tags carry no meaning for the reports, decode the item
+        return self.decode()
+
+
+def decode_payload(text):
+    return CborDecoder(base64.b64decode(text)).decode()
+
+
+# Invoked by the topic rule with {"data": base64 of the MQTT payload, "topic": topic}.
+# The device payload is itself base64 CBOR, the decoded report is republished
+# as JSON under REPUBLISH_TOPIC_PREFIX.
+def handler(event, context):
+    global iot_data
+    if iot_data is None:
+        import boto3
+        iot_data = boto3.client("iot-data")
+    report = decode_payload(base64.b64decode(event["data"]).decode("ascii"))
+    topic = event["topic"]
+    if not topic.startswith("/"):
+        topic = "/" + topic
+    iot_data.publish(topic=REPUBLISH_TOPIC_PREFIX + topic, qos=0, payload=json.dumps(report))
+    return report
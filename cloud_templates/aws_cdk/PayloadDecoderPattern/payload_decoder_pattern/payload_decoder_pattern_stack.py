@@ -0,0 +1,130 @@
+import sys
+from aws_cdk import (
+    Stack,
+    aws_lambda as _lambda,
+    aws_iot as iot,
+    aws_iam as iam,
+    aws_logs as logs
+)
+from constructs import Construct
+import aws_cdk as cdk
+
+sys.path.append('../')
+from common.inputValidation import *
+
+class PayloadDecoderPatternStack(Stack):
+
+    # Defining class variables
+    topic_sql = ""
+    payload_keys = []
+    republish_topic_prefix = ""
+    decoder_function_name = ""
+    decoder_iot_rule_name = ""
+
+    def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        # Getting the context parameters
+
+        # Required parameters for users to set in the CLI command or cdk.json
+        self.topic_sql = self.node.try_get_context("topic_sql")
+        self.payload_keys = self.node.try_get_context("payload_keys")
+
+        # Optional parameters for users to set in the CLI command or cdk.json
+        self.republish_topic_prefix = self.node.try_get_context("republish_topic_prefix")
+        self.decoder_function_name = self.node.try_get_context("decoder_function_name")
+        self.decoder_iot_rule_name = self.node.try_get_context("decoder_iot_rule_name")
+
+        # Perform input validation
+        self.performInputValidation()
+
+        # Creating the Lambda function that decodes the CBOR reports
+        decoder_function = _lambda.Function(self, self.decoder_function_name, function_name=self.decoder_function_name,
+            runtime=_lambda.Runtime.PYTHON_3_9, handler="decoder.handler", code=_lambda.Code.from_asset("lambda"),
+            environment={
+                "PAYLOAD_KEYS": ",".join(self.payload_keys),
+                "REPUBLISH_TOPIC_PREFIX": self.republish_topic_prefix
+            })
+        decoder_function.add_to_role_policy(iam.PolicyStatement(effect=iam.Effect.ALLOW,
+            resources=[f"arn:aws:iot:{cdk.Aws.REGION}:{cdk.Aws.ACCOUNT_ID}:topic/{self.republish_topic_prefix}/*"], actions=["iot:Publish"]))
+        decoder_function.apply_removal_policy(policy=cdk.RemovalPolicy.DESTROY)
+
+        # Creating a cloudwatch log group for topic rule's error action
+        log_group = logs.LogGroup(self, "iot_to_decoder_log_group" , log_group_name="iot_to_decoder_log_group", removal_policy=cdk.RemovalPolicy.DESTROY)
+
+        iot_to_cloudwatch_logs_role = iam.Role(self, "iot_to_decoder_log_group_role", assumed_by=iam.ServicePrincipal("iot.amazonaws.com"))
+        iot_to_cloudwatch_logs_role.add_to_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW, resources=[log_group.log_group_arn],
+            actions=["logs:CreateLogGroup", "logs:CreateLogStream", "logs:PutLogEvents", "logs:PutMetricFilter", "logs:PutRetentionPolicy"]))
+        iot_to_cloudwatch_logs_role.node.add_dependency(log_group)
+        iot_to_cloudwatch_logs_role.apply_removal_policy(policy=cdk.RemovalPolicy.DESTROY)
+
+        # Creating the IoT Topic Rule
+        topic_rule = iot.CfnTopicRule(self, self.decoder_iot_rule_name, topic_rule_payload=iot.CfnTopicRule.TopicRulePayloadProperty(
+            actions=[iot.CfnTopicRule.ActionProperty(lambda_=iot.CfnTopicRule.LambdaActionProperty(
+                function_arn=decoder_function.function_arn
+            ))],
+            sql=self.topic_sql,
+            aws_iot_sql_version = '2016-03-23',
+            error_action= iot.CfnTopicRule.ActionProperty(
+                cloudwatch_logs=iot.CfnTopicRule.CloudwatchLogsActionProperty(
+                    log_group_name=log_group.log_group_name,
+                    role_arn=iot_to_cloudwatch_logs_role.role_arn
+                )
+            )))
+        topic_rule.node.add_dependency(decoder_function)
+        topic_rule.apply_removal_policy(policy=cdk.RemovalPolicy.DESTROY)
+
+        # Allowing the topic rule to invoke the decoder
+        decoder_function.add_permission("iot_invoke_permission", principal=iam.ServicePrincipal("iot.amazonaws.com"),
+            action="lambda:InvokeFunction", source_arn=topic_rule.attr_arn)
+
+    def performInputValidation(self):
+        self.validateSql(self.topic_sql)
+        self.validatePayloadKeys(self.payload_keys)
+        self.validateRepublishTopicPrefix(self.republish_topic_prefix)
+        self.validateFunctionName(self.decoder_function_name)
+        self.validateIoTTopicRuleName(self.decoder_iot_rule_name)
+
+    def validateSql(self, sqlStatement):
+        if not sqlStatement:
+            raise NoSQL
+        elif type(sqlStatement) != str:
+            raise WrongFormattedInput("The input sql statement does not have a right format. Please refer to README.md for more information.")
+        return
+
+    def validatePayloadKeys(self, keyList):
+        if not keyList:
+            raise WrongFormattedInput("No payload keys are provided. Please refer to README.md for more information.")
+        elif type(keyList) != list:
+            raise WrongFormattedInput("The provided input for the payload key list is not of type list.")
+        else:
+            for k in keyList:
+                if type(k) != str or not k or "," in k:
+                    raise WrongFormattedInput("At least one of the provided payload keys is not a non-empty string without commas.")
+            return
+
+    def validateRepublishTopicPrefix(self, inputStr):
+        if not inputStr:
+            self.republish_topic_prefix = "decoded"
+        elif type(inputStr) != str:
+            raise WrongFormattedInput("The provided input for the republish topic prefix is not of type string.")
+        else:
+            checkInputPattern(self, r'^[a-zA-Z0-9-_/]+$' , inputStr, "republish topic prefix")
+
+    def validateFunctionName(self, inputStr):
+        if not inputStr:
+            self.decoder_function_name = "DemoPayloadDecoder"
+        elif type(inputStr) != str:
+            raise WrongFormattedInput("The provided input for the Lambda function name is not of type string.")
+        else:
+            checkInputLength(self, 1, 64, inputStr, "Lambda function")
+            checkInputPattern(self, r'^[a-zA-Z0-9-_]+$' , inputStr, "Lambda function")
+
+    def validateIoTTopicRuleName(self, inputStr):
+        if not inputStr:
+            self.decoder_iot_rule_name = "DemoIoTtoPayloadDecoderRule"
+        elif type(inputStr) != str:
+            raise WrongFormattedInput("The provided input for topic rule name is not of type string.")
+        else:
+            checkInputPattern(self, r'^[a-zA-Z0-9_]+$' , inputStr, "IoT rule")
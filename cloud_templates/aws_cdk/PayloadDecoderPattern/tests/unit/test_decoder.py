@@ -0,0 +1,36 @@
+import base64
+import os
+import sys
+
+import pytest
+
+# The decoder reads its key dictionary when it is imported
+KEYS = ["tempf", "humidity", "pressure", "winddir"]
+os.environ["PAYLOAD_KEYS"] = ",".join(KEYS)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "..", "lambda"))
+# the device side encoder, from the CircuitPython example
+sys.path.insert(0, os.path.join(HERE, "..", "..", "..", "..", "..", "examples", "python", "sara_example"))
+
+from decoder import decode_payload
+from payload_codec import CborEncoder
+
+# Testing that device reports decode to what was sent
+
+def test_round_trip_with_keys():
+    report = {"tempf": 71.5, "humidity": 40, "pressure": 1013.25, "winddir": -5}
+    assert decode_payload(CborEncoder(KEYS).encode(report)) == report
+
+def test_round_trip_without_keys():
+    report = {"station": "roof", "ok": True, "rain": None, "samples": [1, 300, 70000]}
+    assert decode_payload(CborEncoder().encode(report)) == report
+
+def test_unknown_keys_keep_their_name():
+    report = {"tempf": 70.0, "battery": 3.5}
+    assert decode_payload(CborEncoder(KEYS).encode(report)) == report
+
+def test_truncated_payload():
+    data = CborEncoder(KEYS).encodeBinary({"tempf": 70.0})
+    with pytest.raises(ValueError, match=r"truncated CBOR payload"):
+        decode_payload(base64.b64encode(data[:-1]).decode("ascii"))
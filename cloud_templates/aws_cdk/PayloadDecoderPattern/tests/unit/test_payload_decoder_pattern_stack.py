@@ -0,0 +1,128 @@
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+from aws_cdk.assertions import Match
+import pytest
+
+from payload_decoder_pattern.payload_decoder_pattern_stack import PayloadDecoderPatternStack
+
+# Setting the context for the app 
+app = core.App(context={
+    "topic_sql": "SELECT encode(*, 'base64') AS data, topic() AS topic FROM 'EL-decoder-test/#'",
+    "payload_keys": ["temperature", "pressure", "humidity"],
+    "republish_topic_prefix": "cdk_decoded",
+    "decoder_function_name": "cdk_payload_decoder",
+    "decoder_iot_rule_name": "cdk_to_payload_decoder_rule"
+})
+
+stack = PayloadDecoderPatternStack(app, "payload-decoder-pattern")
+template = assertions.Template.from_stack(stack)
+
+# Defining Capture objects for obtaining values in tests
+function_ref = assertions.Capture()
+rule_ref = assertions.Capture()
+
+# Testing the resources' creation and properties
+
+def test_decoder_function_creation():
+    template.has_resource("AWS::Lambda::Function", {"DeletionPolicy":"Delete", "UpdateReplacePolicy":"Delete"})
+    template.resource_count_is("AWS::Lambda::Function", 1)
+
+def test_decoder_function_properties():
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": app.node.try_get_context("decoder_function_name"),
+        "Handler": "decoder.handler",
+        "Environment": {
+            "Variables": {
+                "PAYLOAD_KEYS": "temperature,pressure,humidity",
+                "REPUBLISH_TOPIC_PREFIX": app.node.try_get_context("republish_topic_prefix")
+            }
+        }
+    })
+
+def test_decoder_function_publish_policy():
+    template.has_resource_properties("AWS::IAM::Policy", {
+        "PolicyDocument": {
+            "Statement": Match.array_with([
+            {
+                "Action": "iot:Publish",
+                "Effect": "Allow",
+                "Resource": Match.any_value()
+            }]),
+            "Version": Match.any_value()
+        }
+    })
+
+def test_iot_topic_rule_creation():
+    template.has_resource("AWS::IoT::TopicRule", {"DeletionPolicy":"Delete", "UpdateReplacePolicy":"Delete"})
+    template.resource_count_is("AWS::IoT::TopicRule", 1)
+
+def test_iot_topic_rule_properties():
+    template.has_resource_properties("AWS::IoT::TopicRule", {
+        "TopicRulePayload": {
+            "Actions": [{
+                "Lambda": {
+                    "FunctionArn": {
+                        "Fn::GetAtt": [
+                        function_ref,
+                        "Arn"
+                        ]
+                    }
+                }
+            }],
+            "Sql": app.node.try_get_context("topic_sql")
+        }
+    })
+
+def test_lambda_invoke_permission():
+    template.has_resource_properties("AWS::Lambda::Permission", {
+        "Action": "lambda:InvokeFunction",
+        "FunctionName": {
+            "Fn::GetAtt": [
+            function_ref.as_string(),
+            "Arn"
+            ]
+        },
+        "Principal": "iot.amazonaws.com",
+        "SourceArn": {
+            "Fn::GetAtt": [
+            rule_ref,
+            "Arn"
+            ]
+        }
+    })
+
+# Testing input validation process
+
+def test_no_sql():
+    test_app = core.App(context= {
+        "topic_sql": "",
+        "payload_keys": ["temperature"]
+    })
+    with pytest.raises(Exception, match=r"No sql statemtnt .*"):
+        stack = PayloadDecoderPatternStack(test_app, "payload-decoder-pattern")
+        template = assertions.Template.from_stack(stack)
+
+def test_no_payload_keys():
+    test_app = core.App(context= {
+        "topic_sql": "SELECT encode(*, 'base64') AS data, topic() AS topic FROM 'EL-decoder-test/#'"
+    })
+    with pytest.raises(Exception, match=r"No payload keys are provided. *"):
+        stack = PayloadDecoderPatternStack(test_app, "payload-decoder-pattern")
+        template = assertions.Template.from_stack(stack)
+
+def test_wrong_payload_keys():
+    test_app = core.App(context= {
+        "topic_sql": "SELECT encode(*, 'base64') AS data, topic() AS topic FROM 'EL-decoder-test/#'",
+        "payload_keys": "temperature"
+    })
+    with pytest.raises(Exception, match=r"The provided input for the payload key list is not of type list."):
+        stack = PayloadDecoderPatternStack(test_app, "payload-decoder-pattern")
+        template = assertions.Template.from_stack(stack)
+
+    test_app = core.App(context= {
+        "topic_sql": "SELECT encode(*, 'base64') AS data, topic() AS topic FROM 'EL-decoder-test/#'",
+        "payload_keys": ["temperature", "a,b"]
+    })
+    with pytest.raises(Exception, match=r"At least one of the provided payload keys .*"):
+        stack = PayloadDecoderPatternStack(test_app, "payload-decoder-pattern")
+        template = assertions.Template.from_stack(stack)
@@ -0,0 +1,162 @@
+import sys
+import json
+import time
+import argparse
+from expresslink import ExpressLink
+from el_simulator import ModuleSimulator, SimulatedPort, SimulatedPin
+from command_queue import CommandQueue
+from store_forward import StoreAndForward, RamRing
+from payload_codec import JsonEncoder
+from instrumentation import percentile
+
+# Throughput and latency benchmarks for the ExpressLink driver against the
+# simulated module, on a CPython host:
+#
+#   python3 benchmark.py --latency 0.005 --output results.json
+#   python3 benchmark.py --compare results.json
+#
+# Results are written as JSON so runs of different driver versions can be
+# compared. Timings include the simulated module latency, so compare runs
+# made with the same settings.
+
+REPORT = {"tempf": 71.3, "humidity": 40.2, "pressure": 1013.2, "winddir": 225.0, "windspeedmph": 4.2,
+          "windgustmph": 9.8, "windgustdir": 247.5, "windspdmph_avg2m": 3.9, "winddir_avg2m": 231.4,
+          "windgustmph_10m": 12.1, "windgustdir_10m": 247.5, "dailyrainin": 0.11}
+
+def summarize(samples:list, elapsed:float)->dict:
+    return {
+        "count": len(samples),
+        "commands_per_second": len(samples) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(samples, 0.50) * 1000.0,
+        "p95_ms": percentile(samples, 0.95) * 1000.0,
+        "p99_ms": percentile(samples, 0.99) * 1000.0,
+    }
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.module = ModuleSimulator(latency=args.latency, latencies={"AT+CONNECT": args.connect_latency}, seed=1)
+        self.port = SimulatedPort(self.module)
+        self.el = ExpressLink(self.port, SimulatedPin(self.module))
+
+    def wire(self)->dict:
+        return {"bytes_written": self.port.bytesWritten, "bytes_read": self.port.bytesRead}
+
+    def resetWire(self):
+        self.port.bytesWritten = 0
+        self.port.bytesRead = 0
+
+    def boot(self)->dict:
+        self.el.begin(timeout=5.0)
+        self.el.sendCommand("AT+CONF Topic1=/weather/sensor/bench")
+        return {"boot_s": self.el.bootTime}
+
+    def connect(self)->dict:
+        self.module.dropConnection()
+        self.el.serviceEvents()
+        start = time.monotonic()
+        self.el.connect()
+        return {"time_to_connect_s": time.monotonic() - start}
+
+    def commandLatency(self, command:str)->dict:
+        samples = []
+        self.resetWire()
+        start = time.monotonic()
+        for _ in range(self.args.count):
+            t = time.monotonic()
+            self.el.sendCommand(command)
+            samples.append(time.monotonic() - t)
+        result = summarize(samples, time.monotonic() - start)
+        result.update(self.wire())
+        return result
+
+    # the code.py reporting cycle: connection check, encode, publish
+    def reportLoop(self)->dict:
+        encoder = JsonEncoder()
+        forwarder = StoreAndForward(self.el, 1, RamRing(60))
+        samples = []
+        self.resetWire()
+        start = time.monotonic()
+        for _ in range(self.args.count):
+            t = time.monotonic()
+            forwarder.push(encoder.encode(REPORT))
+            if self.el.connect():
+                forwarder.drain()
+            samples.append(time.monotonic() - t)
+        result = summarize(samples, time.monotonic() - start)
+        result.update(self.wire())
+        return result
+
+    # a backlog of reports published right after a reconnect, three ways
+    def burst(self)->dict:
+        payloads = [JsonEncoder().encode(REPORT)] * self.args.burst
+        results = {}
+
+        start = time.monotonic()
+        for payload in payloads:
+            self.el.sendCommand("AT+SEND1 " + payload)
+        results["sequential_s"] = time.monotonic() - start
+
+        start = time.monotonic()
+        self.el.send_batch(1, payloads)
+        results["send_batch_s"] = time.monotonic() - start
+
+        queue = CommandQueue(self.el)
+        start = time.monotonic()
+        for payload in payloads:
+            queue.submit("AT+SEND1 " + payload)
+        queue.flush(30.0)
+        results["command_queue_s"] = time.monotonic() - start
+        results["messages"] = len(payloads)
+        return results
+
+    def run(self)->dict:
+        results = {}
+        results["boot"] = self.boot()
+        results["connect"] = self.connect()
+        results["at"] = self.commandLatency("AT")
+        results["send"] = self.commandLatency("AT+SEND1 " + JsonEncoder().encode(REPORT))
+        results["report_loop"] = self.reportLoop()
+        results["burst"] = self.burst()
+        return results
+
+# print the relative change of every number that is in both runs
+def compare(old:dict, new:dict, path:str=""):
+    for key, value in new.items():
+        name = path + key
+        if isinstance(value, dict) and isinstance(old.get(key), dict):
+            compare(old[key], value, name + ".")
+        elif isinstance(value, (int, float)) and isinstance(old.get(key), (int, float)):
+            before = old[key]
+            change = ((value - before) / before * 100.0) if before else 0.0
+            print("%-40s %12.3f %12.3f %+8.1f%%" % (name, before, value, change))
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="ExpressLink driver benchmark")
+    parser.add_argument("--latency", type=float, default=0.005, help="module response time per command in seconds")
+    parser.add_argument("--connect-latency", type=float, default=0.5, help="module response time for AT+CONNECT in seconds")
+    parser.add_argument("--count", type=int, default=200, help="commands per latency workload")
+    parser.add_argument("--burst", type=int, default=12, help="messages in the reconnect burst")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare the results with an earlier JSON file")
+    args = parser.parse_args(argv)
+
+    report = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {"latency": args.latency, "connect_latency": args.connect_latency,
+                     "count": args.count, "burst": args.burst},
+        "results": Bench(args).run(),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if old.get("settings") != report["settings"]:
+            print("warning: the runs used different settings")
+        compare(old["results"], report["results"])
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,4 +1,3 @@
-import json
 import time
 import board
 import adafruit_bme680
@@ -9,6 +8,10 @@ from analogio import AnalogIn
 from weather_station import weather_station
 
 from expresslink import ExpressLink
+from store_forward import StoreAndForward, RamRing
+from payload_codec import JsonEncoder
+from reconnect import ReconnectScheduler
+from shadow import ReportDelta
 
 time.sleep(2)
 print("WeatherStation Startup")
@@ -71,10 +74,13 @@ ws = weather_station()
 
 windDirection = AnalogIn(board.A0)
 
-uart = busio.UART(board.UART_TX1, board.UART_RX1, baudrate=115200, timeout=30)
+# the driver only reads what has arrived and keeps its own deadline per
+# command, a long UART timeout would only stall it
+uart = busio.UART(board.UART_TX1, board.UART_RX1, baudrate=115200, timeout=0.1)
 el = ExpressLink(uart, DigitalInOut(board.G5), DigitalInOut(board.G2), DigitalInOut(board.G6) )
 
-el.begin()
+while not el.begin():
+    print("Retrying ExpressLink start")
 
 print("ExpressLink Started")
 
@@ -96,6 +102,35 @@ response = el.sendCommand('AT+CONF? ThingName')
 thingName = response[3:]
 response = el.sendCommand("AT+CONF Topic1=/weather/sensor/" + thingName)
 
+# Set to True to report only the fields that moved beyond their deadband,
+# with the full report every hour. Those partial reports go to Topic2, so
+# readers of Topic1 only ever see full reports.
+reportChanges = False
+if reportChanges:
+    response = el.sendCommand("AT+CONF Topic2=/weather/sensor/" + thingName + "/changes")
+
+# Report field names. CborEncoder(reportKeys) sends each key as its index
+# in this tuple, the cloud decoder must be given the same list. To use it,
+# import CborEncoder from payload_codec as well.
+reportKeys = ("tempf", "humidity", "pressure", "winddir", "windspeedmph",
+              "windgustmph", "windgustdir", "windspdmph_avg2m", "winddir_avg2m",
+              "windgustmph_10m", "windgustdir_10m", "dailyrainin")
+encoder = JsonEncoder()
+
+# keep up to an hour of reports while the link is down
+forwarder = StoreAndForward(el, 2 if reportChanges else 1, RamRing(60))
+reconnect = ReconnectScheduler(el)
+
+# Queued reports count as reported once the module has accepted them. A
+# queued report that is lost means starting again from a full report.
+delta = ReportDelta(deadbands={"tempf": 0.5, "humidity": 1.0, "pressure": 0.5,
+                               "winddir": 10.0, "windgustdir": 10.0, "winddir_avg2m": 10.0, "windgustdir_10m": 10.0,
+                               "windspeedmph": 0.5, "windgustmph": 0.5, "windspdmph_avg2m": 0.5, "windgustmph_10m": 0.5,
+                               "dailyrainin": 0.01},
+                    periods={"winddir": 360, "windgustdir": 360, "winddir_avg2m": 360, "windgustdir_10m": 360},
+                    fullInterval=3600.0)
+dropped = 0
+
 reportCounter = 60
 while True:
     led.value = True
@@ -104,27 +139,37 @@ while True:
     ws.addWind(getSpeed(wind), getDirection(windDirection))
 
     if reportCounter == 0:
-        if el.connect() and reportCounter == 0:
-            reportCounter = 60
-            report = {}
-            report["tempf"] = celsius2fahrenheit( bme680.temperature+temperature_offset )
-            report["humidity"] = bme680.relative_humidity
-            report["pressure"] = bme680.pressure
-            report["winddir"] = ws.windDirection
-            report["windspeedmph"] = ws.windSpeed
-            report["windgustmph"] = ws.windGust1minSpeed
-            report["windgustdir"] = ws.windGust1minDirection
-            report["windspdmph_avg2m"] = ws.wind2MinAverageMPH
-            report["winddir_avg2m"] = ws.wind2MinAverageDirection
-            report["windgustmph_10m"] = ws.wind10MinGustMPH
-            report["windgustdir_10m"] = ws.wind10MinGustDirection
-            report["dailyrainin"] = getRainDepth(rain)
-            data = json.dumps(report)
+        reportCounter = 60
+        report = {}
+        report["tempf"] = celsius2fahrenheit( bme680.temperature+temperature_offset )
+        report["humidity"] = bme680.relative_humidity
+        report["pressure"] = bme680.pressure
+        report["winddir"] = ws.windDirection
+        report["windspeedmph"] = ws.windSpeed
+        report["windgustmph"] = ws.windGust1minSpeed
+        report["windgustdir"] = ws.windGust1minDirection
+        report["windspdmph_avg2m"] = ws.wind2MinAverageMPH
+        report["winddir_avg2m"] = ws.wind2MinAverageDirection
+        report["windgustmph_10m"] = ws.wind10MinGustMPH
+        report["windgustdir_10m"] = ws.wind10MinGustDirection
+        report["dailyrainin"] = getRainDepth(rain)
+        if reportChanges:
+            if forwarder.store.dropped != dropped:
+                dropped = forwarder.store.dropped
+                delta.resync()
+            report = delta.update(report, pending=True)
+        if report:
+            data = encoder.encode(report)
             print("Reporting : " + data)
-            el.sendCommand("AT+SEND1 " + data)
+            forwarder.push(data)
+
+    if len(forwarder) and reconnect.ready():
+        if reconnect.connect():
+            forwarder.drain()
+            if not len(forwarder):
+                delta.commit()
         else:
-            reportCounter = 2 # try again in 2 seconds
-            print("No connection")
+            print("No connection, " + str(len(forwarder)) + " reports stored, retry in " + str(int(reconnect.delay)) + " s")
 
     # ensure the LED blink is noticable
     time.sleep(.5)
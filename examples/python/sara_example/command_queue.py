@@ -0,0 +1,159 @@
+import time
+from expresslink import ExpressLink, Response, SEND_WINDOW
+
+# Commands that change the module state. They are never pipelined: the queue
+# waits for every earlier response before writing one, and writes nothing
+# else until its own response has arrived.
+BARRIER_COMMANDS = (
+    "AT+CONNECT",
+    "AT+DISCONNECT",
+    "AT+RESET",
+    "AT+FACTORY_RESET",
+    "AT+CONFMODE",
+    "AT+SLEEP",
+    "AT+OTA",
+)
+
+class PendingCommand:
+    command:str
+    callback:object
+    response:str
+    result:Response
+    done:bool
+    timedOut:bool
+    deadline:float
+    sent:float
+
+    def __init__(self, command:str, callback=None):
+        self.command = command
+        self.callback = callback
+        self.response = ""
+        self.result = Response()
+        self.done = False
+        self.timedOut = False
+        self.deadline = 0.0
+        self.sent = 0.0
+
+    def _complete(self, result:Response, timedOut:bool=False):
+        self.result = result
+        self.response = result.line
+        self.timedOut = timedOut
+        self.done = True
+        if self.callback is not None:
+            self.callback(self)
+
+# Sends queued commands back to back. The next command is written as soon as
+# the response for the previous one has been matched, responses are matched
+# to commands in the order they were written.
+# depth is the number of commands allowed on the wire at once, see SEND_WINDOW
+# in expresslink.py.
+class CommandQueue:
+    el:ExpressLink
+    depth:int
+    maxPending:int
+    _queued:list
+    _inFlight:list
+    _collecting:Response
+
+    def __init__(self, el:ExpressLink, depth:int=SEND_WINDOW, maxPending:int=32):
+        self.el = el
+        self.depth = depth
+        self.maxPending = maxPending
+        self._queued = []
+        self._inFlight = []
+        self._collecting = None
+
+    def __len__(self)->int:
+        return len(self._queued) + len(self._inFlight)
+
+    def submit(self, command:str, callback=None)->PendingCommand:
+        if len(self) >= self.maxPending:
+            raise RuntimeError("command queue full")
+        pending = PendingCommand(command, callback)
+        self._queued.append(pending)
+        self._writeReady()
+        return pending
+
+    def _isBarrier(self, command:str)->bool:
+        for prefix in BARRIER_COMMANDS:
+            if command.startswith(prefix):
+                return True
+        return False
+
+    def _writeReady(self):
+        while self._queued and len(self._inFlight) < self.depth:
+            if self._inFlight:
+                if self._isBarrier(self._inFlight[-1].command):
+                    return
+                if self._isBarrier(self._queued[0].command):
+                    return
+            pending = self._queued.pop(0)
+            if not self._inFlight:
+                pending.deadline = time.monotonic() + self.el.commandTimeout(pending.command)
+            self._inFlight.append(pending)
+            self.el._writeCommand(pending.command)
+            pending.sent = time.monotonic()
+
+    # Match any responses that have arrived and keep the UART busy.
+    # Never blocks, returns the number of commands completed.
+    def poll(self)->int:
+        completed = 0
+        while self._inFlight:
+            line = self.el._pollLine()
+            if line is None:
+                break
+            if self._collecting is None:
+                result = Response(line.decode("utf-8"))
+            else:
+                result = self._collecting
+                result.lines.append(line.decode("utf-8"))
+            if len(result.lines) < result.additional:
+                # the rest of an OK{N} response is still to come
+                self._collecting = result
+                continue
+            self._collecting = None
+            self.el._noteResponse(result.line)
+            pending = self._inFlight.pop(0)
+            if self._inFlight:
+                head = self._inFlight[0]
+                head.deadline = time.monotonic() + self.el.commandTimeout(head.command)
+            self.el._record(pending.command, pending.sent, result.code, False)
+            pending._complete(result)
+            completed += 1
+            self._writeReady()
+
+        if self._inFlight and time.monotonic() >= self._inFlight[0].deadline:
+            # a late response would shift every match after it, so give up on
+            # everything on the wire, the driver drops their replies before
+            # the next command is written
+            timedOut = self._inFlight
+            self._inFlight = []
+            partial = self._collecting
+            self._collecting = None
+            if partial is not None:
+                self.el._skipLines = partial.additional - len(partial.lines)
+                self.el._owedReplies += len(timedOut) - 1
+            else:
+                self.el._owedReplies += len(timedOut)
+            for pending in timedOut:
+                self.el._record(pending.command, pending.sent, -1, True)
+                if partial is not None:
+                    pending._complete(partial, True)
+                    partial = None
+                else:
+                    pending._complete(Response(), True)
+                completed += 1
+        self._writeReady()
+        return completed
+
+    # Run the queue until it is empty or the timeout expires.
+    def flush(self, timeout:float=None)->bool:
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        while len(self):
+            if self.poll() == 0:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.001)
+        return True
@@ -0,0 +1,158 @@
+import sys
+import json
+import time
+import argparse
+from expresslink import ExpressLink, SEND_WINDOW
+from instrumentation import Instrumentation, percentile
+
+# Talks to ExpressLink modules from a PC, through the SerialPassthrough
+# sketch (examples/Arduino/SerialPassthrough) or any USB serial adapter.
+# Needs pyserial.
+#
+#   python3 el_bridge.py /dev/ttyACM0                        interactive shell
+#   python3 el_bridge.py /dev/ttyACM0 --commands setup.txt   run a command file
+#   python3 el_bridge.py /dev/ttyACM0 --publish reports.jsonl --topic 1
+#   python3 el_bridge.py /dev/ttyACM0 /dev/ttyACM1 --ping 100
+#
+# With several ports the same run is made on each module in turn, e.g. to
+# provision or soak test a rack of them. --simulate uses the simulated module
+# in place of a serial port.
+
+def openPort(name:str, baudrate:int):
+    if name == "simulate":
+        from el_simulator import ModuleSimulator, SimulatedPort
+        return SimulatedPort(ModuleSimulator(latency=0.01, latencies={"AT+CONNECT": 0.5}))
+    import serial
+    return serial.Serial(name, baudrate, timeout=0)
+
+# one command with every response line and its round trip time
+def run(el:ExpressLink, command:str)->bool:
+    start = time.monotonic()
+    response = el.request(command)
+    rtt = (time.monotonic() - start) * 1000.0
+    if response.code == -1:
+        print("%-40s (no response) %8.1f ms" % (command, rtt))
+        return False
+    print("%-40s %s %8.1f ms" % (command, response.line, rtt))
+    for line in response.lines:
+        print(" " * 41 + line)
+    return response.ok
+
+def shell(el:ExpressLink):
+    print("Type AT commands, :events to read pending events, :stats for timings, :quit to leave")
+    while True:
+        try:
+            command = input("> ").strip()
+        except EOFError:
+            break
+        if command == ":quit":
+            break
+        elif command == ":events":
+            while True:
+                response = el.request("AT+EVENT?")
+                if not response.ok or not response.payload:
+                    break
+                print(response.line)
+        elif command == ":stats":
+            print(json.dumps(el.stats(), indent=2))
+        elif command:
+            run(el, command)
+
+# Run the commands in a file, one per line, # starts a comment. Returns the
+# number of commands that failed.
+def commandFile(el:ExpressLink, path:str, stopOnError:bool)->int:
+    failed = 0
+    with open(path) as f:
+        for line in f:
+            command = line.strip()
+            if not command or command.startswith("#"):
+                continue
+            if not run(el, command):
+                failed += 1
+                if stopOnError:
+                    break
+    return failed
+
+# Publish every line of a JSON Lines file as one message, window at a time.
+# Returns the number of messages that failed.
+def publishFile(el:ExpressLink, path:str, topicIndex:int, window:int)->int:
+    with open(path) as f:
+        payloads = [json.dumps(json.loads(line), separators=(",", ":")) for line in f if line.strip()]
+    start = time.monotonic()
+    results = el.send_batch(topicIndex, payloads, window)
+    elapsed = time.monotonic() - start
+    failed = len(results) - results.count(0)
+    sent = sum(len(p) for p, r in zip(payloads, results) if r == 0)
+    print("published %d of %d messages in %.2f s, %.1f messages/s, %.0f payload bytes/s" % (
+        len(results) - failed, len(results), elapsed,
+        (len(results) - failed) / elapsed if elapsed else 0.0, sent / elapsed if elapsed else 0.0))
+    for i, result in enumerate(results):
+        if result is None:
+            print("line %d not sent" % (i + 1))
+        elif result:
+            print("line %d failed with %d" % (i + 1, result))
+    return failed
+
+# AT round trips, returns the number that got no answer
+def ping(el:ExpressLink, count:int)->int:
+    samples = []
+    lost = 0
+    for _ in range(count):
+        start = time.monotonic()
+        if el.execute(b"AT") == 0:
+            samples.append(time.monotonic() - start)
+        else:
+            lost += 1
+    if samples:
+        print("%d pings, %d lost, min %.1f ms, avg %.1f ms, p95 %.1f ms, max %.1f ms" % (
+            count, lost, min(samples) * 1000.0, sum(samples) / len(samples) * 1000.0,
+            percentile(samples, 0.95) * 1000.0, max(samples) * 1000.0))
+    else:
+        print("%d pings, all lost" % count)
+    return lost
+
+def main(argv)->int:
+    parser = argparse.ArgumentParser(description="ExpressLink serial bridge")
+    parser.add_argument("ports", nargs="*", help="serial ports of the modules")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--simulate", action="store_true", help="use a simulated module")
+    parser.add_argument("--commands", help="run the AT commands in this file")
+    parser.add_argument("--stop-on-error", action="store_true", help="stop a command file at the first failure")
+    parser.add_argument("--publish", help="publish each line of this JSON Lines file")
+    parser.add_argument("--topic", type=int, default=1, help="topic index for --publish")
+    parser.add_argument("--window", type=int, default=SEND_WINDOW, help="messages written at once by --publish")
+    parser.add_argument("--ping", type=int, default=0, help="measure this many AT round trips")
+    args = parser.parse_args(argv)
+
+    ports = list(args.ports)
+    if args.simulate:
+        ports.append("simulate")
+    if not ports:
+        parser.error("no port given")
+    batch = args.commands or args.publish or args.ping
+    if not batch and len(ports) > 1:
+        parser.error("the interactive shell takes one port")
+
+    failures = 0
+    for name in ports:
+        if len(ports) > 1:
+            print("=== " + name)
+        el = ExpressLink(openPort(name, args.baudrate))
+        el.instrumentation = Instrumentation()
+        if not el.begin(timeout=5.0):
+            print(name + ": no answer from the module")
+            failures += 1
+            continue
+        if not batch:
+            shell(el)
+            continue
+        if args.commands:
+            failures += commandFile(el, args.commands, args.stop_on_error)
+        if args.publish:
+            failures += publishFile(el, args.publish, args.topic, args.window)
+        if args.ping:
+            failures += ping(el, args.ping)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,438 @@
+import os
+import sys
+import time
+import random
+import select
+import threading
+from expresslink import (ERR_OVERFLOW, ERR_PARSE_ERROR, ERR_COMMAND_NOT_FOUND, ERR_PARAMETER_ERROR,
+                         ERR_NO_CONNECTION, ERR_TOPIC_OUT_OF_RANGE, ERR_NOT_ALLOWED,
+                         EVENT_MSG, EVENT_STARTUP, EVENT_CONLOST, EVENT_OTA, EVENT_CONNECT, EVENT_SUBACK)
+
+# A software stand-in for an ExpressLink module, for exercising the driver on
+# a CPython host. ModuleSimulator implements the AT command set, SimulatedPort
+# hands it to the driver in-process and PtySimulator serves it on a pseudo
+# terminal for tools that open a serial device.
+#
+#   python3 el_simulator.py [latency]
+#
+# serves a simulated module on a pty and prints the device path.
+
+ERR_INVALID_KEY_NAME = 9
+ERR_UNABLE_TO_CONNECT = 13
+
+ERROR_TEXT = {
+    ERR_OVERFLOW: "OVERFLOW",
+    ERR_PARSE_ERROR: "PARSE ERROR",
+    ERR_COMMAND_NOT_FOUND: "COMMAND NOT FOUND",
+    ERR_PARAMETER_ERROR: "PARAMETER ERROR",
+    ERR_NO_CONNECTION: "NO CONNECTION",
+    ERR_TOPIC_OUT_OF_RANGE: "TOPIC OUT OF RANGE",
+    ERR_NOT_ALLOWED: "NOT ALLOWED",
+    ERR_INVALID_KEY_NAME: "INVALID KEY NAME",
+    ERR_UNABLE_TO_CONNECT: "UNABLE TO CONNECT",
+}
+
+EVENT_NAMES = {
+    EVENT_MSG: "MSG",
+    EVENT_STARTUP: "STARTUP",
+    EVENT_CONLOST: "CONLOST",
+    EVENT_OTA: "OTA",
+    EVENT_CONNECT: "CONNECT",
+    EVENT_SUBACK: "SUBACK",
+}
+
+MAX_TOPICS = 16
+
+class ModuleSimulator:
+    # latency is the processing time of every command in seconds, latencies
+    # overrides it per command prefix, e.g. {"AT+CONNECT": 2.0}.
+    # errorRate is the chance that an AT+SEND fails with errorCode.
+    # dropRate is the chance that the connection is lost after an AT+SEND.
+    def __init__(self, latency:float=0.005, latencies=None, errorRate:float=0.0, errorCode:int=ERR_NO_CONNECTION,
+                 dropRate:float=0.0, maxMessage:int=5000, thingName:str="simulated-thing", seed=None):
+        self.latency = latency
+        self.latencies = {"AT+CONNECT": 0.5} if latencies is None else latencies
+        self.errorRate = errorRate
+        self.errorCode = errorCode
+        self.dropRate = dropRate
+        self.maxMessage = maxMessage
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.config = {"ThingName": thingName, "Endpoint": "simulated.iot.amazonaws.com"}
+        self.connected = False
+        self.connectable = True
+        self.events = []
+        self.messages = []
+        self.subscribed = set()
+        self.published = []
+        self.commands = 0
+        self._failures = []
+        self.otaState = 0
+        self.otaImage = b""
+        self.otaVersion = ""
+        self.otaOffset = 0
+
+    # --- test controls ---
+
+    def queueEvent(self, event:int, parameter:int=0):
+        with self.lock:
+            self.events.append((event, parameter))
+
+    @property
+    def eventPending(self)->bool:
+        return len(self.events) > 0
+
+    def dropConnection(self):
+        with self.lock:
+            if self.connected:
+                self.connected = False
+                # subscriptions do not survive a lost connection
+                self.subscribed = set()
+                self.events.append((EVENT_CONLOST, 0))
+
+    # deliver an inbound message as if the broker had sent it
+    def deliver(self, topicIndex:int, message:str):
+        with self.lock:
+            self.messages.append((topicIndex, message))
+            self.events.append((EVENT_MSG, topicIndex))
+
+    # propose a host image update as the OTA service would
+    def offerHostImage(self, image:bytes, version:str="1.0.0"):
+        with self.lock:
+            self.otaImage = image
+            self.otaVersion = version
+            self.otaOffset = 0
+            self.otaState = 2
+            self.events.append((EVENT_OTA, 2))
+
+    # make the next count commands fail with code
+    def failNext(self, code:int, count:int=1):
+        with self.lock:
+            self._failures.extend([code] * count)
+
+    def reset(self):
+        with self.lock:
+            self.connected = False
+            self.messages = []
+            self.subscribed = set()
+            self.events = [(EVENT_STARTUP, 0)]
+
+    # --- command handling ---
+
+    def commandLatency(self, command:str)->float:
+        best = ""
+        for prefix in self.latencies:
+            # a latency for AT+CONNECT does not apply to the AT+CONNECT? query
+            if command[len(prefix):].startswith("?") and not prefix.endswith("?"):
+                continue
+            if command.startswith(prefix) and len(prefix) > len(best):
+                best = prefix
+        if best:
+            return self.latencies[best]
+        return self.latency
+
+    def _error(self, code:int)->list:
+        return ["ERR" + str(code) + " " + ERROR_TEXT.get(code, "ERROR")]
+
+    # optional number right after a command name, e.g. the 1 of AT+SEND1
+    def _index(self, text:str):
+        digits = ""
+        while text and text[0].isdigit():
+            digits += text[0]
+            text = text[1:]
+        return (int(digits) if digits else None), text
+
+    # Returns the response lines for one command line.
+    def handle(self, line:str)->list:
+        with self.lock:
+            self.commands += 1
+            if self._failures:
+                return self._error(self._failures.pop(0))
+            return self._handle(line.rstrip("\r"))
+
+    def _handle(self, line:str)->list:
+        if not line.startswith("AT"):
+            return self._error(ERR_PARSE_ERROR)
+        if line == "AT":
+            return ["OK"]
+        if not line.startswith("AT+"):
+            return self._error(ERR_COMMAND_NOT_FOUND)
+        command = line[3:]
+        for name in ("CONNECT?", "CONNECT", "DISCONNECT", "SEND", "GET", "EVENT?", "CONF?", "CONF",
+                     "SUBSCRIBE", "UNSUBSCRIBE", "RESET", "OTA?", "OTA"):
+            if command.startswith(name):
+                handler = getattr(self, "_cmd_" + name.replace("?", "_query"))
+                return handler(command[len(name):])
+        return self._error(ERR_COMMAND_NOT_FOUND)
+
+    def _cmd_CONNECT_query(self, args:str)->list:
+        if self.connected:
+            return ["OK 1 CONNECTED"]
+        return ["OK 0 DISCONNECTED"]
+
+    def _cmd_CONNECT(self, args:str)->list:
+        if not self.connectable:
+            self.events.append((EVENT_CONNECT, ERR_UNABLE_TO_CONNECT))
+            return self._error(ERR_UNABLE_TO_CONNECT)
+        if not self.connected:
+            self.connected = True
+            self.events.append((EVENT_CONNECT, 0))
+        return ["OK 1 CONNECTED"]
+
+    def _cmd_DISCONNECT(self, args:str)->list:
+        self.connected = False
+        return ["OK 0 DISCONNECTED"]
+
+    def _topic(self, index):
+        if index is None or index < 1 or index > MAX_TOPICS:
+            return None
+        return self.config.get("Topic" + str(index))
+
+    def _cmd_SEND(self, args:str)->list:
+        index, message = self._index(args)
+        if message.startswith(" "):
+            message = message[1:]
+        if not self.connected:
+            return self._error(ERR_NO_CONNECTION)
+        topic = self._topic(index)
+        if topic is None:
+            return self._error(ERR_TOPIC_OUT_OF_RANGE)
+        if len(message) > self.maxMessage:
+            return self._error(ERR_OVERFLOW)
+        if self.errorRate and self.random.random() < self.errorRate:
+            return self._error(self.errorCode)
+        self.published.append((topic, message))
+        if self.dropRate and self.random.random() < self.dropRate:
+            self.connected = False
+            self.events.append((EVENT_CONLOST, 0))
+        return ["OK"]
+
+    def _cmd_GET(self, args:str)->list:
+        index, _ = self._index(args)
+        for i, (topicIndex, message) in enumerate(self.messages):
+            if index is None:
+                del self.messages[i]
+                return ["OK1 " + self._topic(topicIndex), message]
+            if topicIndex == index:
+                del self.messages[i]
+                return ["OK " + message]
+        return ["OK"]
+
+    def _cmd_EVENT_query(self, args:str)->list:
+        if not self.events:
+            return ["OK"]
+        event, parameter = self.events.pop(0)
+        return ["OK " + str(event) + " " + str(parameter) + " " + EVENT_NAMES.get(event, "EVENT")]
+
+    def _cmd_CONF_query(self, args:str)->list:
+        key = args.strip()
+        if key not in self.config:
+            return self._error(ERR_INVALID_KEY_NAME)
+        lines = self.config[key].split("\n")
+        if len(lines) == 1:
+            return ["OK " + lines[0]]
+        return ["OK" + str(len(lines) - 1) + " " + lines[0]] + lines[1:]
+
+    def _cmd_CONF(self, args:str)->list:
+        if "=" not in args:
+            return self._error(ERR_PARAMETER_ERROR)
+        key, value = args.strip().split("=", 1)
+        if key.startswith("Topic"):
+            index, _ = self._index(key[5:])
+            if index is None or index < 1 or index > MAX_TOPICS:
+                return self._error(ERR_TOPIC_OUT_OF_RANGE)
+        self.config[key] = value
+        return ["OK"]
+
+    def _cmd_SUBSCRIBE(self, args:str)->list:
+        index, _ = self._index(args)
+        if self._topic(index) is None:
+            return self._error(ERR_TOPIC_OUT_OF_RANGE)
+        if not self.connected:
+            return self._error(ERR_NO_CONNECTION)
+        self.subscribed.add(index)
+        self.events.append((EVENT_SUBACK, index))
+        return ["OK"]
+
+    def _cmd_UNSUBSCRIBE(self, args:str)->list:
+        index, _ = self._index(args)
+        if self._topic(index) is None:
+            return self._error(ERR_TOPIC_OUT_OF_RANGE)
+        self.subscribed.discard(index)
+        return ["OK"]
+
+    def _cmd_OTA_query(self, args:str)->list:
+        if self.otaState == 2:
+            return ["OK 2 " + self.otaVersion]
+        if self.otaState == 5:
+            return ["OK 5 " + str(len(self.otaImage))]
+        return ["OK " + str(self.otaState)]
+
+    # The image counts as downloaded and verified as soon as it is accepted.
+    # READ answers OK {count} {data as hex}, just OK 0 at the end.
+    def _cmd_OTA(self, args:str)->list:
+        parts = args.split()
+        if not parts:
+            return self._error(ERR_PARAMETER_ERROR)
+        if parts[0] == "ACCEPT":
+            if self.otaState != 2:
+                return self._error(ERR_NOT_ALLOWED)
+            self.otaState = 5
+            self.otaOffset = 0
+            return ["OK"]
+        if parts[0] in ("READ", "SEEK"):
+            if self.otaState != 5:
+                return self._error(ERR_NOT_ALLOWED)
+            if len(parts) != 2 or not parts[1].isdigit():
+                return self._error(ERR_PARAMETER_ERROR)
+            value = int(parts[1])
+            if parts[0] == "SEEK":
+                if value > len(self.otaImage):
+                    return self._error(ERR_PARAMETER_ERROR)
+                self.otaOffset = value
+                return ["OK"]
+            data = self.otaImage[self.otaOffset:self.otaOffset + value]
+            self.otaOffset += len(data)
+            if not data:
+                return ["OK 0"]
+            return ["OK " + str(len(data)) + " " + data.hex().upper()]
+        if parts[0] in ("CLOSE", "FLUSH"):
+            self.otaState = 0
+            self.otaImage = b""
+            return ["OK"]
+        return self._error(ERR_PARAMETER_ERROR)
+
+    def _cmd_RESET(self, args:str)->list:
+        self.connected = False
+        self.messages = []
+        self.subscribed = set()
+        self.events.append((EVENT_STARTUP, 0))
+        return ["OK"]
+
+# In-process serial port connected to a ModuleSimulator. It offers the parts
+# of the busio.UART / pyserial interface the driver uses. The module works
+# through commands one at a time, each response becomes readable once the
+# command latency has passed, without any threads.
+class SimulatedPort:
+    def __init__(self, module:ModuleSimulator):
+        self.module = module
+        self.timeout = 0
+        self.bytesWritten = 0
+        self.bytesRead = 0
+        self._line = b""
+        self._scheduled = []
+        self._busyUntil = 0.0
+        self._rx = bytearray()
+
+    def write(self, data)->int:
+        data = bytes(data)
+        self.bytesWritten += len(data)
+        self._line += data
+        while b"\n" in self._line:
+            line, self._line = self._line.split(b"\n", 1)
+            command = line.decode("utf-8", "replace")
+            start = max(time.monotonic(), self._busyUntil)
+            self._busyUntil = start + self.module.commandLatency(command)
+            response = "".join([r + "\r\n" for r in self.module.handle(command)])
+            self._scheduled.append((self._busyUntil, response.encode("utf-8")))
+        return len(data)
+
+    def _release(self):
+        now = time.monotonic()
+        while self._scheduled and self._scheduled[0][0] <= now:
+            self._rx.extend(self._scheduled.pop(0)[1])
+
+    @property
+    def in_waiting(self)->int:
+        self._release()
+        return len(self._rx)
+
+    def read(self, count:int=1)->bytes:
+        self._release()
+        data = bytes(self._rx[:count])
+        del self._rx[:count]
+        self.bytesRead += len(data)
+        return data
+
+    def readinto(self, buf)->int:
+        self._release()
+        count = min(len(buf), len(self._rx))
+        buf[:count] = self._rx[:count]
+        del self._rx[:count]
+        self.bytesRead += count
+        return count
+
+    def readline(self)->bytes:
+        deadline = time.monotonic() + self.timeout
+        while b"\n" not in self._rx and time.monotonic() < deadline:
+            time.sleep(0.001)
+            self._release()
+        end = self._rx.find(b"\n") + 1
+        if end == 0:
+            end = len(self._rx)
+        return self.read(end)
+
+    def reset_input_buffer(self):
+        self._release()
+        self._rx = bytearray()
+
+# Stands in for the event pin: high while the module has events queued.
+class SimulatedPin:
+    def __init__(self, module:ModuleSimulator):
+        self.module = module
+        self.direction = None
+
+    @property
+    def value(self)->bool:
+        return self.module.eventPending
+
+# Serves a ModuleSimulator on a pseudo terminal from a background thread.
+class PtySimulator:
+    def __init__(self, module:ModuleSimulator):
+        import tty
+        self.module = module
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port_name = os.ttyname(self._slave)
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _serve(self):
+        pending = b""
+        while self._running:
+            ready, _, _ = select.select([self._master], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                pending += os.read(self._master, 4096)
+            except OSError:
+                return
+            while b"\n" in pending:
+                line, pending = pending.split(b"\n", 1)
+                command = line.decode("utf-8", "replace")
+                time.sleep(self.module.commandLatency(command))
+                response = "".join([r + "\r\n" for r in self.module.handle(command)])
+                os.write(self._master, response.encode("utf-8"))
+
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.005
+    server = PtySimulator(ModuleSimulator(latency=latency))
+    server.start()
+    print("Simulated ExpressLink on " + server.port_name)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
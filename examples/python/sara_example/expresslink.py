@@ -1,79 +1,742 @@
-import busio
 import time
-from digitalio import DigitalInOut, Direction, Pull
+try:
+    from digitalio import DigitalInOut, Direction
+except ImportError:
+    # CPython host, any pins passed in are stand-ins with the same interface
+    DigitalInOut = object
+    class Direction:
+        INPUT = 0
+        OUTPUT = 1
+
+# Response deadlines in seconds, matched by command prefix in order.
+# Query forms must come before the command they query.
+COMMAND_TIMEOUTS = (
+    ("AT+CONNECT?", 1.0),
+    ("AT+CONNECT", 30.0),
+    ("AT+DISCONNECT", 30.0),
+    ("AT+SEND", 2.0),
+    ("AT+CONF", 1.0),
+    ("AT", 1.0),
+)
+_COMMAND_TIMEOUTS_BYTES = tuple([(prefix.encode("utf-8"), timeout) for prefix, timeout in COMMAND_TIMEOUTS])
+DEFAULT_TIMEOUT = 5.0
+
+# Commands written before their responses are read. The ExpressLink
+# specification has the module process one command at a time and does not
+# promise to buffer the ones after it, so only raise this for modules known
+# to buffer further commands while busy. Used by send_batch(),
+# StoreAndForward and CommandQueue.
+SEND_WINDOW = 1
+
+# Start up timing in seconds: the whole boot, one AT probe, and the polling
+# interval of the power check pin
+BOOT_TIMEOUT = 30.0
+PROBE_TIMEOUT = 0.2
+POWER_POLL = 0.01
+
+# ExpressLink error codes
+ERR_OVERFLOW = 1
+ERR_PARSE_ERROR = 2
+ERR_COMMAND_NOT_FOUND = 3
+ERR_PARAMETER_ERROR = 4
+ERR_INVALID_ESCAPE = 5
+ERR_NO_CONNECTION = 6
+ERR_TOPIC_OUT_OF_RANGE = 7
+ERR_NOT_ALLOWED = 8
+
+# ExpressLink event identifiers reported by AT+EVENT?
+EVENT_MSG = 1
+EVENT_STARTUP = 2
+EVENT_CONLOST = 3
+EVENT_OVERRUN = 4
+EVENT_OTA = 5
+EVENT_CONNECT = 6
+EVENT_CONFMODE = 7
+EVENT_SUBACK = 8
+EVENT_SUBNACK = 9
+
+# A parsed module response. code follows checkResponse: 0 for OK, the error
+# number for ERR{n} and -1 when nothing usable arrived. payload is the text
+# after the status, lines holds the additional lines announced by OK{N}.
+class Response:
+    line:str
+    code:int
+    additional:int
+    payload:str
+    lines:list
+
+    def __init__(self, line:str="", lines=None):
+        self.line = line
+        self.lines = [] if lines is None else lines
+        self.code = -1
+        self.additional = 0
+        i = 0
+        if line.startswith("OK"):
+            self.code = 0
+            i = 2
+            while i < len(line) and line[i].isdigit():
+                i += 1
+            if i > 2:
+                self.additional = int(line[2:i])
+        elif line.startswith("ERR"):
+            i = 3
+            while i < len(line) and line[i].isdigit():
+                i += 1
+            if i > 3:
+                self.code = int(line[3:i])
+        if self.code != -1 and i < len(line) and line[i] == " ":
+            i += 1
+        self.payload = line[i:] if self.code != -1 else line
+
+    @property
+    def ok(self)->bool:
+        return self.code == 0
+
+    # True when fewer lines arrived than the response announced
+    @property
+    def incomplete(self)->bool:
+        return len(self.lines) < self.additional
+
+    def __str__(self)->str:
+        return "\n".join([self.line] + self.lines)
 
 class ExpressLink:
     event_pin:DigitalInOut # change to be an input pin with a callback
     powerOn_pin:DigitalInOut
     powerCheck_pin:DigitalInOut
     _connected:bool
-    port:serial
+    lastConnectCode:int
+    connectionLosses:int
+    _stateChecked:float
+    stateMaxAge:float
+    events:list
+    maxEvents:int
+    payload:memoryview
+    additionalLines:int
+    _rxBuf:bytearray
+    _rxView:memoryview
+    _rxStart:int
+    _rxEnd:int
+    _rxScan:int
+    _rxSkip:bool
+    _txBuf:bytearray
+    _txView:memoryview
+    _skipLines:int
+    _owedReplies:int
+    bootTime:float
+    instrumentation:object # Instrumentation or None
+    maxMessage:int
+    _sendPrefixes:dict
+    port:object # busio.UART or serial.Serial
 
-    def __init__(self, port, event, powerOn, powerCheck):
+    # the pins are optional for hosts that only have the serial port
+    # stateMaxAge is how long a cached connection state is trusted before
+    # connect() asks the module again
+    # rxSize and txSize size the preallocated UART buffers, a response line
+    # longer than rxSize is dropped
+    def __init__(self, port, event=None, powerOn=None, powerCheck=None, stateMaxAge:float=300.0, rxSize:int=1024, txSize:int=512):
         self.port = port
         self.event_pin = event
         self.powerOn_pin = powerOn
         self.powerCheck_pin = powerCheck
-        self.event_pin.direction = Direction.INPUT
-        self.powerCheck_pin.direction = Direction.INPUT
-        self.powerOn_pin.direction = Direction.OUTPUT
-        self.powerOn_pin.value = False
+        if self.event_pin is not None:
+            self.event_pin.direction = Direction.INPUT
+        if self.powerCheck_pin is not None:
+            self.powerCheck_pin.direction = Direction.INPUT
+        if self.powerOn_pin is not None:
+            self.powerOn_pin.direction = Direction.OUTPUT
+            self.powerOn_pin.value = False
+        self._connected = False
+        self.lastConnectCode = 0
+        # connection drops seen, a change means subscriptions are gone
+        self.connectionLosses = 0
+        self._stateChecked = 0.0
+        self.stateMaxAge = stateMaxAge
+        self.events = []
+        self.maxEvents = 16
+        self._rxBuf = bytearray(rxSize)
+        self._rxView = memoryview(self._rxBuf)
+        self._rxStart = 0
+        self._rxEnd = 0
+        self._rxScan = 0
+        self._rxSkip = False
+        self._txBuf = bytearray(txSize)
+        self._txView = memoryview(self._txBuf)
+        self.payload = self._rxView[0:0]
+        self.additionalLines = 0
+        self._skipLines = 0
+        # replies still to come for commands that timed out
+        self._owedReplies = 0
+        self.bootTime = 0.0
+        self.instrumentation = None
+        # longest payload publish() and send_batch() accept
+        self.maxMessage = 5000
+        self._sendPrefixes = {}
 
     # This function relies upon the SARA_ON signal to work
-    def _powerOn(self)->bool:
-        while self.powerCheck_pin.value == True:
-            self.powerOn_pin.value = True
-            time.sleep(.50)
+    # Holds the power pin only until the module reports it is on.
+    def _powerOn(self, deadline:float)->bool:
+        while True:
+            powered = self._powerStep(deadline)
+            if powered is not None:
+                return powered
+            time.sleep(POWER_POLL)
+
+    # One check of the power pins, None while the module is still coming up,
+    # otherwise whether it came up before the deadline.
+    def _powerStep(self, deadline:float):
+        if self.powerCheck_pin is None or self.powerOn_pin is None:
+            return True
+        if self.powerCheck_pin.value == True:
+            if time.monotonic() < deadline:
+                self.powerOn_pin.value = True
+                return None
+            self.powerOn_pin.value = False
+            return False
         self.powerOn_pin.value = False
-        time.sleep(.1)
         print("ExpressLink Powered")
         return True
 
-    def _comCheck(self)->bool:
+    # drop whatever the module printed while booting
+    def _flushInput(self):
+        self.port.reset_input_buffer()
+        self._discardInput()
+        self._skipLines = 0
+        self._owedReplies = 0
+
+    # Send one AT and wait briefly for OK, skipping any boot output still
+    # arriving in front of it.
+    def _probe(self, timeout:float)->bool:
+        deadline = time.monotonic() + timeout
+        self._writeCommand("AT")
+        while True:
+            answered = self._probeLine(self._readLine(max(0.0, deadline - time.monotonic())))
+            if answered is not None:
+                return answered
+
+    # One line read by a probe, None when it was boot output to skip,
+    # otherwise whether the probe was answered.
+    def _probeLine(self, line):
+        if line is None:
+            self._flushInput()
+            return False
+        if line.startswith(b"OK"):
+            return True
+        return None
+
+    # Read and drop the OKs of earlier probes that timed out, as many as
+    # count, until the line has been quiet for an AT deadline. Probes sent
+    # before the module was up are never answered, so the count is only an
+    # upper bound.
+    def _dropLateProbes(self, count:int):
+        while count > 0:
+            line = self._readLine(self.commandTimeout("AT"))
+            if line is None:
+                return
+            if line.startswith(b"OK"):
+                count -= 1
+
+    def _comCheck(self, deadline:float)->bool:
         print("Checking Communications")
-        response = ""
-        while response.find("OK") != 0:
-            time.sleep(.5)
-            response = self.sendCommand("AT")
+        self._flushInput()
+        unanswered = 0
+        while time.monotonic() < deadline:
+            if self._probe(min(PROBE_TIMEOUT, deadline - time.monotonic())):
+                # a slow module answers the timed out probes late, their OKs
+                # must not answer the next command
+                self._dropLateProbes(unanswered)
+                return True
+            unanswered += 1
+        return False
+
+    # Power the module and wait until it answers, for at most timeout
+    # seconds. The time taken is kept in self.bootTime.
+    def begin(self, timeout:float=BOOT_TIMEOUT)->bool:
+        start = time.monotonic()
+        deadline = start + timeout
+        self._setConnected(False)
+        up = self._powerOn(deadline) and self._comCheck(deadline)
+        return self._started(start, up, timeout)
+
+    # Record how begin() went. Like _powerStep() and _probeLine(), the helpers
+    # from here to _requestAnswered() hold the decisions shared with
+    # AsyncExpressLink, which only differs in how it waits for the UART.
+    def _started(self, start:float, up:bool, timeout:float)->bool:
+        self.bootTime = time.monotonic() - start
+        if up:
+            print("ExpressLink Up in " + str(self.bootTime) + " s")
+        else:
+            print("ExpressLink did not start within " + str(timeout) + " s")
+        return up
+
+    # Apply an AT+CONNECT? response, returns True when AT+CONNECT has to be
+    # sent.
+    def _connectQueried(self, response:str)->bool:
+        if response.find("OK 1") != -1:
+            self._setConnected(True)
+            return False
+        if not self._connected:
+            # without the event pin the drop may not have been seen yet
+            self.connectionLosses += 1
+        self._setConnected(False)
         return True
 
-    def begin(self):
-        self._connected = False
-        self._powerOn()
-        self._comCheck()
-        print("ExpressLink Up")
+    def _connectAttempted(self, response:str):
+        self.lastConnectCode = self.checkResponse(response)
+        if self.lastConnectCode == 0:
+            self._setConnected(True)
+        if self.instrumentation is not None:
+            self.instrumentation.reconnect(self.lastConnectCode == 0)
+
+    # the result of a request whose status line did not arrive in time
+    def _requestTimedOut(self, command:str, sent:float)->Response:
+        self._owedReplies += 1
+        self._record(command, sent, -1, True)
+        return Response()
+
+    # Finish a request once its status line and as many of the additional
+    # lines as arrived in time have been read.
+    def _requestAnswered(self, command:str, sent:float, response:Response)->Response:
+        if response.incomplete:
+            self._skipLines = response.additional - len(response.lines)
+        self._noteResponse(response.line)
+        self._record(command, sent, response.code, False)
+        return response
+
+    def _setConnected(self, connected:bool):
+        if self._connected and not connected:
+            self.connectionLosses += 1
+        self._connected = connected
+        self._stateChecked = time.monotonic()
+
+    # The cached state is kept current by the CONLOST and CONNECT events and
+    # by ERR6 responses, so it only has to be confirmed once it is stale.
+    def _stateIsFresh(self)->bool:
+        return time.monotonic() - self._stateChecked < self.stateMaxAge
+
+    def _noteResponse(self, response:str):
+        if response.startswith("ERR") and self.checkResponse(response) == ERR_NO_CONNECTION:
+            self._setConnected(False)
+
+    def eventPending(self)->bool:
+        return self.event_pin is not None and self.event_pin.value == True
+
+    # Record one AT+EVENT? response as (id, parameter, mnemonic) in
+    # self.events, returns False when the response holds no event.
+    def _handleEvent(self, response:str)->bool:
+        parts = response.split(" ")
+        if len(parts) < 3 or parts[0] != "OK":
+            return False
+        event = int(parts[1])
+        parameter = int(parts[2])
+        if event == EVENT_CONLOST or event == EVENT_STARTUP:
+            self._setConnected(False)
+        elif event == EVENT_CONNECT:
+            self._setConnected(parameter == 0)
+        if len(self.events) >= self.maxEvents:
+            self.events.pop(0)
+        self.events.append((event, parameter, " ".join(parts[3:])))
+        return True
+
+    # Drain the module event queue while the event pin is asserted.
+    def serviceEvents(self)->int:
+        count = 0
+        while self.eventPending():
+            if not self._handleEvent(self.sendCommand("AT+EVENT?")):
+                break
+            count += 1
+        return count
 
     def connect(self)->bool:
+        self.serviceEvents()
+        if self._connected and self._stateIsFresh():
+            return True
         response = self.sendCommand("AT+CONNECT?")
         print("connect_check : " + response)
-        code = response.find("OK 1")
-        if code == -1:
-            self._connected = False
+        if self._connectQueried(response):
             response = self.sendCommand("AT+CONNECT")
             print("connect:"+response)
-            if self.checkResponse(response) == 0:
-                self._connected = True
-        else:
-            self._connected = True
+            self._connectAttempted(response)
         return self._connected
 
-    def sendCommand(self, command:str)->str:
+    def commandTimeout(self, command)->float:
+        table = COMMAND_TIMEOUTS
+        if not isinstance(command, str):
+            table = _COMMAND_TIMEOUTS_BYTES
+        for prefix, timeout in table:
+            if command[:len(prefix)] == prefix:
+                return timeout
+        return DEFAULT_TIMEOUT
+
+    # drop everything received but not yet consumed
+    def _discardInput(self):
+        self._rxStart = 0
+        self._rxEnd = 0
+        self._rxScan = 0
+        self._rxSkip = False
+
+    # move whatever has arrived on the UART into the receive buffer
+    def _fill(self):
+        waiting = self.port.in_waiting
+        if not waiting:
+            return
+        size = len(self._rxBuf)
+        if self._rxEnd + waiting > size and self._rxStart > 0:
+            # make room by moving the unread bytes to the front
+            count = self._rxEnd - self._rxStart
+            self._rxView[0:count] = self._rxView[self._rxStart:self._rxEnd]
+            self._rxScan -= self._rxStart
+            self._rxStart = 0
+            self._rxEnd = count
+        if self._rxEnd == size:
+            if self._rxScan < self._rxEnd:
+                # a complete line is still waiting to be consumed
+                return
+            # the line does not fit, skip the rest of it
+            self._discardInput()
+            self._rxSkip = True
+        count = min(waiting, size - self._rxEnd)
+        count = self.port.readinto(self._rxView[self._rxEnd:self._rxEnd + count])
+        if count:
+            self._rxEnd += count
+            if self.instrumentation is not None:
+                self.instrumentation.bytesRead += count
+
+    # Return the index of the '\n' ending the line at _rxStart, or -1 when
+    # no complete line has arrived yet.
+    def _pollLineEnd(self)->int:
+        self._fill()
+        buf = self._rxBuf
+        while True:
+            i = self._rxScan
+            end = self._rxEnd
+            while i < end and buf[i] != 10:
+                i += 1
+            self._rxScan = i
+            if i == end:
+                return -1
+            if not self._rxSkip:
+                return i
+            self._rxSkip = False
+            self._consumeLine(i)
+
+    def _consumeLine(self, lineEnd:int):
+        self._rxStart = lineEnd + 1
+        self._rxScan = self._rxStart
+        if self._rxStart == self._rxEnd:
+            self._rxStart = 0
+            self._rxEnd = 0
+            self._rxScan = 0
+
+    # index just past the last character of the line, without the '\r'
+    def _lineStop(self, lineEnd:int)->int:
+        if lineEnd > self._rxStart and self._rxBuf[lineEnd - 1] == 13:
+            return lineEnd - 1
+        return lineEnd
+
+    # wait for a complete line until the deadline, returns -1 on timeout
+    def _readLineEnd(self, timeout:float)->int:
+        deadline = time.monotonic() + timeout
+        while True:
+            lineEnd = self._pollLineEnd()
+            if lineEnd >= 0:
+                return lineEnd
+            if time.monotonic() >= deadline:
+                return -1
+            time.sleep(0.001)
+
+    # return one complete response line if it has already arrived, otherwise None
+    def _pollLine(self):
+        lineEnd = self._pollLineEnd()
+        if lineEnd < 0:
+            return None
+        line = bytes(self._rxView[self._rxStart:self._lineStop(lineEnd)])
+        self._consumeLine(lineEnd)
+        return line
+
+    # wait for a response line until the deadline, returns None on timeout
+    def _readLine(self, timeout:float):
+        lineEnd = self._readLineEnd(timeout)
+        if lineEnd < 0:
+            return None
+        line = bytes(self._rxView[self._rxStart:self._lineStop(lineEnd)])
+        self._consumeLine(lineEnd)
+        return line
+
+    # Parse the status of the response line between start and stop. Sets
+    # self.payload to a view of the text after the status and returns
+    # checkResponse codes. OK{N} leaves N in self.additionalLines.
+    def _parseStatus(self, start:int, stop:int)->int:
+        buf = self._rxBuf
+        self.additionalLines = 0
+        status = -1
+        i = start
+        if stop - start >= 2 and buf[i] == 79 and buf[i + 1] == 75: # OK
+            i += 2
+            count = 0
+            while i < stop and 48 <= buf[i] <= 57:
+                count = count * 10 + buf[i] - 48
+                i += 1
+            self.additionalLines = count
+            status = 0
+        elif stop - start >= 4 and buf[i] == 69 and buf[i + 1] == 82 and buf[i + 2] == 82: # ERR
+            i += 3
+            digits = i
+            code = 0
+            while i < stop and 48 <= buf[i] <= 57:
+                code = code * 10 + buf[i] - 48
+                i += 1
+            # ERR without a number is not a status, as for Response
+            if i > digits:
+                status = code
+            else:
+                i = start
+        if status != -1 and i < stop and buf[i] == 32:
+            i += 1
+        self.payload = self._rxView[i:stop]
+        return status
+
+    # Allocation free command path. The command is copied into the transmit
+    # buffer, so passing bytes or a bytearray avoids encoding it. Returns the
+    # checkResponse code; the response text after the status is available as
+    # the memoryview self.payload until the next command is sent.
+    # Additional lines of an OK{N} response are left in the receive buffer
+    # so self.payload stays valid, they are skipped before the next command.
+    def execute(self, command, timeout:float=None)->int:
+        if timeout is None:
+            timeout = self.commandTimeout(command)
+        if isinstance(command, str):
+            command = command.encode("utf-8")
+        count = len(command)
+        if count + 1 > len(self._txBuf):
+            raise ValueError("command longer than the transmit buffer")
+        self._skipPendingLines()
+        self._txView[0:count] = command
+        self._txBuf[count] = 10
+        self.port.write(self._txView[0:count + 1])
+        if self.instrumentation is not None:
+            self.instrumentation.bytesWritten += count + 1
+        return self._readStatus(command, time.monotonic(), timeout)
+
+    # Read the status line of a command written at sent, for execute() and
+    # publish(). Same results and self.payload handling as execute().
+    def _readStatus(self, command, sent:float, timeout:float)->int:
+        lineEnd = self._readLineEnd(timeout)
+        if lineEnd < 0:
+            self.payload = self._rxView[0:0]
+            self.additionalLines = 0
+            self._owedReplies += 1
+            self._record(command, sent, -1, True)
+            return -1
+        status = self._parseStatus(self._rxStart, self._lineStop(lineEnd))
+        self._consumeLine(lineEnd)
+        self._skipLines = self.additionalLines
+        if status == ERR_NO_CONNECTION:
+            self._setConnected(False)
+        self._record(command, sent, status, False)
+        return status
+
+    # pass one command result to the instrumentation hooks, if attached
+    def _record(self, command, sent:float, code:int, timedOut:bool):
+        if self.instrumentation is not None:
+            self.instrumentation.record(command, time.monotonic() - sent, code, timedOut)
+
+    # Read and drop what earlier commands left behind before the next one is
+    # written: the additional lines of an OK{N} response, and the replies of
+    # commands that timed out, which would otherwise answer the next command.
+    def _skipPendingLines(self):
+        while self._skipLines > 0 or self._owedReplies > 0:
+            self._dropPending(self._readLine(DEFAULT_TIMEOUT))
+
+    # Account for one line read by _skipPendingLines(), an additional line
+    # or the status line of an owed reply. None means nothing came in time,
+    # so nothing more is on its way either.
+    def _dropPending(self, line):
+        if line is None:
+            self._skipLines = 0
+            self._owedReplies = 0
+        elif self._skipLines > 0:
+            self._skipLines -= 1
+        else:
+            self._owedReplies -= 1
+            response = Response(line.decode("utf-8"))
+            self._skipLines = response.additional
+            self._noteResponse(response.line)
+
+    def _writeCommand(self, command:str):
+        self._skipPendingLines()
         command += '\n'
-        self.port.write(command.encode("utf-8"))
-        time.sleep(1)
-        response = self.port.readline()
-        if response != None:
-            return response.decode("utf-8")
+        data = command.encode("utf-8")
+        self.port.write(data)
+        if self.instrumentation is not None:
+            self.instrumentation.bytesWritten += len(data)
+
+    # Send a command and read its whole response, including the additional
+    # lines announced by OK{N}, so the next command starts in step.
+    def request(self, command:str, timeout:float=None)->Response:
+        if timeout is None:
+            timeout = self.commandTimeout(command)
+        self._writeCommand(command)
+        sent = time.monotonic()
+        line = self._readLine(timeout)
+        if line is None:
+            return self._requestTimedOut(command, sent)
+        response = Response(line.decode("utf-8"))
+        for _ in range(response.additional):
+            line = self._readLine(timeout)
+            if line is None:
+                break
+            response.lines.append(line.decode("utf-8"))
+        return self._requestAnswered(command, sent, response)
+
+    # returns the first response line, see request() for the full response
+    def sendCommand(self, command:str, timeout:float=None)->str:
+        return self.request(command, timeout).line
+
+    # "AT+SEND{n} " as bytes, kept per topic so publishing does not build it
+    def _sendPrefix(self, topicIndex:int)->bytes:
+        prefix = self._sendPrefixes.get(topicIndex)
+        if prefix is None:
+            prefix = ("AT+SEND" + str(topicIndex) + " ").encode("utf-8")
+            self._sendPrefixes[topicIndex] = prefix
+        return prefix
+
+    # a payload as something port.write() takes, only a str is copied
+    def _payloadBytes(self, payload):
+        if isinstance(payload, str):
+            return payload.encode("utf-8")
+        return payload
+
+    # The error the module would answer a payload with, checked before
+    # anything is written. A line break would end the command early.
+    def _payloadError(self, payload)->int:
+        if len(payload) > self.maxMessage:
+            return ERR_OVERFLOW
+        if 10 in payload:
+            return ERR_PARAMETER_ERROR
+        return 0
+
+    # Publish payload on topicIndex without building the command in memory.
+    # The prefix, the payload and the line end are written to the UART one
+    # after the other. payload is a str or anything bytes-like. It can also
+    # be a function that writes the payload itself in pieces, as
+    # payload(write) with write(chunk). The length then has to be given up
+    # front, for the maxMessage check. Returns the checkResponse code, with
+    # the response text in self.payload as for execute(). A payload that
+    # fails the checks is not written and returns ERR_OVERFLOW or
+    # ERR_PARAMETER_ERROR.
+    def publish(self, topicIndex:int, payload, length:int=None, timeout:float=None)->int:
+        prefix = self._sendPrefix(topicIndex)
+        if timeout is None:
+            timeout = self.commandTimeout(prefix)
+        writer = None
+        if callable(payload):
+            if length is None:
+                raise ValueError("length is needed with a writer function")
+            if length > self.maxMessage:
+                return ERR_OVERFLOW
+            writer = payload
+        else:
+            payload = self._payloadBytes(payload)
+            error = self._payloadError(payload)
+            if error:
+                return error
+            length = len(payload)
+        self._skipPendingLines()
+        port = self.port
+        port.write(prefix)
+        if writer is None:
+            port.write(payload)
         else:
-            return ""
+            written = [0]
+            def write(chunk):
+                if written[0] + len(chunk) > length:
+                    raise ValueError("writer exceeded the given length")
+                written[0] += len(chunk)
+                port.write(chunk)
+            try:
+                writer(write)
+            except BaseException:
+                # end the line anyway so the module answers, its reply is
+                # dropped before the next command
+                port.write(b"\n")
+                self._owedReplies += 1
+                raise
+        port.write(b"\n")
+        if self.instrumentation is not None:
+            self.instrumentation.bytesWritten += len(prefix) + length + 1
+        return self._readStatus(prefix, time.monotonic(), timeout)
+
+    # write the AT+SEND of a payload that passed _payloadError()
+    def _writeSend(self, prefix:bytes, payload):
+        self.port.write(prefix)
+        self.port.write(payload)
+        self.port.write(b"\n")
+        if self.instrumentation is not None:
+            self.instrumentation.bytesWritten += len(prefix) + len(payload) + 1
+
+    # Publish several messages on one topic, window commands at a time, and
+    # collect one result per payload, in order, as checkResponse codes:
+    # 0 sent, ERR code from the module, or -1 when no response arrived.
+    # After a response fails to arrive no further window is written, the
+    # payloads in them get None.
+    # window None writes the whole batch in one burst, see SEND_WINDOW.
+    def send_batch(self, topic_index:int, payloads, window:int=SEND_WINDOW)->list:
+        results = []
+        prefix = "AT+SEND" + str(topic_index) + " "
+        prefixBytes = self._sendPrefix(topic_index)
+        timeout = self.commandTimeout(prefix)
+        if window is None or window < 1:
+            window = max(len(payloads), 1)
+        for start in range(0, len(payloads), window):
+            chunk = payloads[start:start + window]
+            self._skipPendingLines()
+            # written piece by piece, joining the window would copy every
+            # payload. Payloads the module would refuse are not written and
+            # get their error without a response to wait for.
+            errors = []
+            count = 0
+            for p in chunk:
+                p = self._payloadBytes(p)
+                error = self._payloadError(p)
+                errors.append(error)
+                if error:
+                    continue
+                self.port.write(prefixBytes)
+                self.port.write(p)
+                self.port.write(b"\n")
+                count += len(prefixBytes) + len(p) + 1
+            # each message is timed from the write of its chunk
+            sent = time.monotonic()
+            if self.instrumentation is not None:
+                self.instrumentation.bytesWritten += count
+            for i in range(len(errors)):
+                if errors[i]:
+                    results.append(errors[i])
+                    continue
+                response = self._readLine(timeout)
+                if response is None:
+                    # fail what was written and not yet answered, the replies
+                    # still on their way are dropped before the next command
+                    for error in errors[i:]:
+                        if error:
+                            results.append(error)
+                        else:
+                            self._owedReplies += 1
+                            self._record(prefix, sent, -1, True)
+                            results.append(-1)
+                    results.extend([None] * (len(payloads) - len(results)))
+                    return results
+                results.append(self.checkResponse(response.decode("utf-8")))
+                self._record(prefix, sent, results[-1], False)
+        return results
 
     def checkResponse(self, response:str)->int:
-        if response.find("OK") == 0:
-            return 0
-        else:
-            if response.find("ERR") == 0:
-                return int(response[3:])
-            else:
-                return -1
-        
-        
\ No newline at end of file
+        return Response(response).code
+
+    # counters collected since the instrumentation was attached or reset,
+    # None when no instrumentation is attached
+    def stats(self):
+        if self.instrumentation is None:
+            return None
+        return self.instrumentation.snapshot()
@@ -0,0 +1,138 @@
+import time
+import asyncio
+from expresslink import ExpressLink, Response, BOOT_TIMEOUT, PROBE_TIMEOUT, POWER_POLL, DEFAULT_TIMEOUT
+
+# asyncio front end for ExpressLink. It shares the port and receive buffer of
+# the wrapped driver and yields to other tasks while the module is busy, so
+# sensor sampling keeps running during AT+CONNECT and AT+SEND.
+# Works with CPython asyncio and the CircuitPython asyncio library.
+class AsyncExpressLink:
+    el:ExpressLink
+    pollInterval:float
+    _lock:asyncio.Lock
+
+    def __init__(self, el:ExpressLink, pollInterval:float=0.005):
+        self.el = el
+        self.pollInterval = pollInterval
+        self._lock = asyncio.Lock()
+
+    async def _readLine(self, timeout:float):
+        deadline = time.monotonic() + timeout
+        while True:
+            line = self.el._pollLine()
+            if line is not None:
+                return line
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(self.pollInterval)
+
+    # ExpressLink._skipPendingLines() without blocking the event loop, called
+    # before every write so the driver has nothing left to wait for
+    async def _skipPendingLines(self):
+        el = self.el
+        while el._skipLines > 0 or el._owedReplies > 0:
+            el._dropPending(await self._readLine(DEFAULT_TIMEOUT))
+
+    async def request(self, command:str, timeout:float=None)->Response:
+        if timeout is None:
+            timeout = self.el.commandTimeout(command)
+        async with self._lock:
+            await self._skipPendingLines()
+            self.el._writeCommand(command)
+            sent = time.monotonic()
+            line = await self._readLine(timeout)
+            if line is None:
+                return self.el._requestTimedOut(command, sent)
+            response = Response(line.decode("utf-8"))
+            for _ in range(response.additional):
+                line = await self._readLine(timeout)
+                if line is None:
+                    break
+                response.lines.append(line.decode("utf-8"))
+            return self.el._requestAnswered(command, sent, response)
+
+    async def send(self, command:str, timeout:float=None)->str:
+        return (await self.request(command, timeout)).line
+
+    # ExpressLink.publish() for a str or bytes-like payload, with the same
+    # checks. Returns the checkResponse code.
+    async def publish(self, topicIndex:int, payload, timeout:float=None)->int:
+        el = self.el
+        prefix = el._sendPrefix(topicIndex)
+        if timeout is None:
+            timeout = el.commandTimeout(prefix)
+        payload = el._payloadBytes(payload)
+        error = el._payloadError(payload)
+        if error:
+            return error
+        async with self._lock:
+            await self._skipPendingLines()
+            el._writeSend(prefix, payload)
+            sent = time.monotonic()
+            line = await self._readLine(timeout)
+            if line is None:
+                return el._requestTimedOut(prefix, sent).code
+            return el._requestAnswered(prefix, sent, Response(line.decode("utf-8"))).code
+
+    async def _powerOn(self, deadline:float)->bool:
+        while True:
+            powered = self.el._powerStep(deadline)
+            if powered is not None:
+                return powered
+            await asyncio.sleep(POWER_POLL)
+
+    async def _probe(self, timeout:float)->bool:
+        deadline = time.monotonic() + timeout
+        async with self._lock:
+            await self._skipPendingLines()
+            self.el._writeCommand("AT")
+            while True:
+                answered = self.el._probeLine(await self._readLine(max(0.0, deadline - time.monotonic())))
+                if answered is not None:
+                    return answered
+
+    # ExpressLink._dropLateProbes() without blocking the event loop
+    async def _dropLateProbes(self, count:int):
+        while count > 0:
+            line = await self._readLine(self.el.commandTimeout("AT"))
+            if line is None:
+                return
+            if line.startswith(b"OK"):
+                count -= 1
+
+    async def _comCheck(self, deadline:float)->bool:
+        print("Checking Communications")
+        self.el._flushInput()
+        unanswered = 0
+        while time.monotonic() < deadline:
+            if await self._probe(min(PROBE_TIMEOUT, deadline - time.monotonic())):
+                async with self._lock:
+                    await self._dropLateProbes(unanswered)
+                return True
+            unanswered += 1
+        return False
+
+    async def begin(self, timeout:float=BOOT_TIMEOUT)->bool:
+        el = self.el
+        start = time.monotonic()
+        deadline = start + timeout
+        el._setConnected(False)
+        up = await self._powerOn(deadline) and await self._comCheck(deadline)
+        return el._started(start, up, timeout)
+
+    async def serviceEvents(self)->int:
+        count = 0
+        while self.el.eventPending():
+            if not self.el._handleEvent(await self.send("AT+EVENT?")):
+                break
+            count += 1
+        return count
+
+    async def connect(self)->bool:
+        el = self.el
+        await self.serviceEvents()
+        if el._connected and el._stateIsFresh():
+            return True
+        if el._connectQueried(await self.send("AT+CONNECT?")):
+            el._connectAttempted(await self.send("AT+CONNECT"))
+        return el._connected
@@ -0,0 +1,314 @@
+import os
+from expresslink import ExpressLink
+from expresslink_async import AsyncExpressLink
+from el_simulator import ModuleSimulator, SimulatedPort, SimulatedPin, PtySimulator
+from command_queue import CommandQueue
+from store_forward import StoreAndForward, RamRing
+from instrumentation import Instrumentation
+from gateway import ModuleGateway
+from topics import TopicTable
+from subscriptions import MessageDispatcher
+from ota import HostImageReader
+from shadow import ReportDelta
+from policy import CommandPolicy
+from uart_recorder import RecordingPort, ReplayPort, WRITE, READ
+from expresslink_threaded import ThreadedExpressLink, PRIORITY_HIGH, PRIORITY_BULK
+
+# Exercises the driver against the simulated module, run on a CPython host:
+#   python3 expresslink_test.py
+
+module = ModuleSimulator(latency=0.002, latencies={"AT+CONNECT": 0.05})
+el = ExpressLink(SimulatedPort(module), SimulatedPin(module))
+
+assert el.begin(timeout=2.0)
+print("boot time " + str(el.bootTime))
+
+# a module answering AT slower than a probe waits is still in step after begin
+slow = ExpressLink(SimulatedPort(ModuleSimulator(latency=0.25)))
+assert slow.begin(timeout=2.0)
+assert slow.sendCommand("AT+CONF? ThingName") == "OK simulated-thing"
+
+thingName = el.sendCommand("AT+CONF? ThingName")[3:]
+assert thingName == "simulated-thing"
+assert el.checkResponse(el.sendCommand("AT+CONF Topic1=/weather/sensor/" + thingName)) == 0
+
+assert el.connect()
+assert el.sendCommand("AT+SEND1 hello") == "OK"
+print("connected and sent")
+
+# connection loss arrives as an event and is seen without AT+CONNECT?
+module.dropConnection()
+before = module.commands
+el.serviceEvents()
+assert not el._connected
+assert el.connect()
+print("reconnected after " + str(module.commands - before) + " commands")
+
+# multi-line responses leave the stream in step
+module.config["Certificate"] = "-----BEGIN-----\nABCD\n-----END-----"
+response = el.request("AT+CONF? Certificate")
+assert response.payload == "-----BEGIN-----" and response.lines == ["ABCD", "-----END-----"]
+assert el.sendCommand("AT") == "OK"
+
+# a reply arriving after its command timed out does not answer the next one
+assert el.request("AT+CONF? ThingName", timeout=0.0).code == -1
+assert el.sendCommand("AT") == "OK"
+assert el.execute(b"AT+CONF? ThingName", timeout=0.0) == -1
+assert el.sendCommand("AT+CONF? Certificate") == "OK2 -----BEGIN-----"
+assert el.sendCommand("AT") == "OK"
+assert el.execute(b"AT+CONF? Certificate", timeout=0.0) == -1
+assert el.sendCommand("AT+CONF? ThingName") == "OK simulated-thing"
+
+# a line that only looks like an error is not taken for a result
+odd = ExpressLink(ReplayPort([(WRITE, 0.0, b"AT\n"), (READ, 0.0, b"ERR X\r\n")], speed=0))
+assert odd.execute(b"AT") == -1 == odd.checkResponse("ERR X") and bytes(odd.payload) == b"ERR X"
+
+# errors are reported per message
+module.failNext(6)
+assert el.send_batch(1, ["a", "b", "c"]) == [6, 0, 0]
+
+# payloads go to the UART without being copied into a command string
+assert el.publish(1, b"bytes payload") == 0 and module.published[-1][1] == "bytes payload"
+assert el.publish(1, memoryview(bytearray(b"from a view"))) == 0 and module.published[-1][1] == "from a view"
+assert el.publish(1, lambda write: (write(b"written "), write(b"in pieces")), length=17) == 0
+assert module.published[-1][1] == "written in pieces"
+assert el.publish(1, "x" * (el.maxMessage + 1)) == 1 and el.publish(1, "two\nlines") == 4
+assert el.publish(1, memoryview(b"two\nlines")) == 4
+def overrun(write):
+    write(b"too long")
+try:
+    el.publish(1, overrun, length=3)
+    assert False
+except ValueError:
+    pass
+assert el.sendCommand("AT+CONF? ThingName") == "OK simulated-thing"
+assert el.send_batch(1, [b"first", "x" * (el.maxMessage + 1), "last"]) == [0, 1, 0]
+# after a lost response the later windows are not written, nor counted
+batcher = ExpressLink(SimulatedPort(ModuleSimulator(latency=0.002, latencies={"AT+SEND": 0.2})))
+batcher.commandTimeout = lambda command: 0.05
+batcher.instrumentation = Instrumentation()
+assert batcher.send_batch(1, ["a", "b", "x" * (el.maxMessage + 1)]) == [-1, None, None]
+assert batcher.stats()["commands"]["AT+SEND"]["timeouts"] == 1
+assert batcher.send_batch(1, ["a", "b"], window=2) == [-1, -1]
+assert el.sendCommand("AT") == "OK"
+
+# failures are retried, reconnected or passed on by error code
+policy = CommandPolicy(el)
+module.failNext(8)
+assert policy.sendCommand("AT+SEND1 busy") == "OK" and policy.retries == 1
+module.dropConnection()
+module.failNext(6)
+assert policy.publish(1, "after reconnect") == 0 and policy.reconnects == 1
+module.failNext(4)
+assert policy.sendCommand("AT+SEND1 bad") == "ERR4 PARAMETER ERROR" and policy.retries == 2
+assert policy.request("AT+CONF? ThingName", timeout=0.0).code == -1 and policy.retries == 3
+assert policy.sendCommand("AT+CONF? ThingName") == "OK simulated-thing"
+module.deliver(4, "once")
+assert policy.request("AT+GET4", timeout=0.0).code == -1 and policy.retries == 3
+assert policy.sendCommand("AT+GET4") == "OK"
+module.connectable = False
+module.dropConnection()
+module.failNext(6)
+assert policy.publish(1, "no link") == 6 and policy.reconnects == 1
+module.connectable = True
+assert el.connect()
+
+queue = CommandQueue(el)
+pending = [queue.submit("AT+SEND1 queued " + str(i)) for i in range(10)]
+assert queue.flush(5.0)
+assert [p.response for p in pending] == ["OK"] * 10
+
+# latency and error counters per command kind
+el.instrumentation = Instrumentation()
+el.sendCommand("AT")
+module.failNext(6)
+el.sendCommand("AT+SEND1 counted")
+queue.submit("AT+SEND1 queued")
+queue.flush(5.0)
+stats = el.stats()
+assert stats["commands"]["AT"]["count"] == 1
+assert stats["commands"]["AT+SEND"]["count"] == 2 and stats["commands"]["AT+SEND"]["errors"] == 1
+assert stats["error_codes"] == {"6": 1} and stats["bytes_written"] > 0 and stats["bytes_read"] > 0
+el.instrumentation = None
+
+# publishing by topic name only configures a slot for new topics
+topics = TopicTable(el, first=2, last=3)
+assert topics.publish("/a", "1") == 0 and topics.publish("/b", "2") == 0
+assert topics.publish("/a", "3") == 0 and topics.configWrites == 2
+assert topics.publish("/c", "4") == 0 and topics.slotFor("/a") == 2
+assert module.config["Topic3"] == "/c" and module.published[-1] == ("/c", "4")
+del module.config["Topic2"]
+assert topics.publish("/a", "5") == 0 and module.published[-1] == ("/a", "5")
+assert topics.publish("/a", "one\ntwo") == 4
+assert el.sendCommand("AT+CONF? ThingName") == "OK simulated-thing"
+
+# inbound messages reach their callbacks, with and without the event pin
+inbox = []
+dispatcher = MessageDispatcher(el, TopicTable(el, first=4, last=5))
+assert dispatcher.subscribe("/commands", lambda topic, message: inbox.append((topic, message))) == 0
+module.deliver(4, "reboot")
+module.deliver(4, "blink")
+assert dispatcher.poll() == 2 and inbox == [("/commands", "reboot"), ("/commands", "blink")]
+before = module.commands
+assert dispatcher.poll() == 0 and module.commands == before
+module.dropConnection()
+assert el.connect() and 4 not in module.subscribed
+dispatcher.poll()
+assert 4 in module.subscribed
+polled = ExpressLink(SimulatedPort(module))
+dispatcher = MessageDispatcher(polled, TopicTable(polled, first=4, last=5), minInterval=0.0)
+assert dispatcher.subscribe("/commands", lambda topic, message: inbox.append((topic, message))) == 0
+module.deliver(4, "status")
+assert dispatcher.poll() == 1 and inbox[-1] == ("/commands", "status")
+module.dropConnection()
+assert polled.connect() and 4 not in module.subscribed
+dispatcher.poll()
+assert 4 in module.subscribed
+module.events = []
+
+# reports survive a dropped link
+forwarder = StoreAndForward(el, 1, RamRing(10))
+module.dropConnection()
+el.serviceEvents()
+assert not forwarder.send("stored 1")
+assert not forwarder.send("stored 2")
+assert el.connect()
+assert forwarder.drain() == 2
+assert module.published[-1] == ("/weather/sensor/simulated-thing", "stored 2")
+module.failNext(8)
+assert not forwarder.send("busy") and len(forwarder) == 1
+assert forwarder.drain() == 1 and forwarder.store.dropped == 0
+module.failNext(4)
+assert forwarder.send("refused") and forwarder.store.dropped == 1
+print("store and forward drained")
+
+# several threads share the module through one writer thread
+import threading
+with ThreadedExpressLink(el, maxQueued=4) as shared:
+    results = []
+    def produce(n):
+        futures = [shared.publish(1, "thread " + str(n) + " " + str(i), priority=PRIORITY_BULK) for i in range(10)]
+        results.extend(f.result() for f in futures)
+    producers = [threading.Thread(target=produce, args=(n,)) for n in range(3)]
+    for t in producers:
+        t.start()
+    assert shared.sendCommand("AT", priority=PRIORITY_HIGH) == "OK"
+    for t in producers:
+        t.join()
+    assert results == [0] * 30
+    assert shared.publish(1, "two\nlines").result() == 4
+    assert shared.sendCommand("AT+CONF? ThingName") == "OK simulated-thing"
+print("threaded producers in step")
+
+# publishes spread over several modules and move off a dead one
+import asyncio
+async def gatewayCheck():
+    slow = AsyncExpressLink(ExpressLink(SimulatedPort(ModuleSimulator(latency=0.25))))
+    assert await slow.begin(2.0) and await slow.send("AT+CONF? ThingName") == "OK simulated-thing"
+    gateway = ModuleGateway(retryDelay=0.0)
+    modules = [ModuleSimulator(latency=0.002, latencies={"AT+CONNECT": 0.01}) for _ in range(3)]
+    for m in modules:
+        gateway.add(ExpressLink(SimulatedPort(m), SimulatedPin(m)))
+    assert await gateway.begin(2.0) == 3
+    for g in gateway.modules:
+        await g.ael.send("AT+CONF Topic1=gateway")
+    assert await asyncio.gather(*[gateway.publish(1, str(i)) for i in range(30)]) == [0] * 30
+    assert [len(m.published) for m in modules] == [10, 10, 10]
+    modules[0].dropConnection()
+    modules[0].connectable = False
+    assert await asyncio.gather(*[gateway.publish(1, str(i)) for i in range(30)]) == [0] * 30
+    assert gateway.healthy() == 2 and gateway.metrics()["published"] == 60
+    assert await gateway.publish(1, "two\nlines") == 4
+    assert await gateway.modules[1].ael.send("AT+CONF? ThingName") == "OK simulated-thing"
+    modules[0].connectable = True
+    assert await gateway.maintain() == 1
+asyncio.run(gatewayCheck())
+print("gateway failover")
+
+# the late reply to a timed out command is awaited without stalling other tasks
+import time
+async def drainCheck():
+    ael = AsyncExpressLink(ExpressLink(SimulatedPort(ModuleSimulator(latency=0.002, latencies={"AT+CONF?": 0.3}))))
+    assert (await ael.request("AT+CONF? ThingName", timeout=0.0)).code == -1
+    ticks = []
+    async def ticker():
+        while len(ticks) < 30:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.02)
+    assert await ael.send("AT") == "OK"
+    await task
+    assert max([b - a for a, b in zip(ticks, ticks[1:])]) < 0.1
+    # a drop nobody reported is counted, so subscriptions are restored
+    before = ael.el.connectionLosses
+    assert await ael.connect() and ael.el.connectionLosses == before + 1
+asyncio.run(drainCheck())
+
+# a host image survives an interrupted download and is verified
+import io
+import hashlib
+import tempfile
+image = bytes(range(256)) * 20
+module.offerHostImage(image)
+reader = HostImageReader(el, chunkSize=300)
+assert reader.state()[0] == 2 and reader.accept() == 0
+imagePath = os.path.join(tempfile.mkdtemp(), "host.bin")
+def interrupt(offset, size, rate):
+    if offset == 1500:
+        module.failNext(6, 4)
+assert not reader.download(imagePath, hashlib.sha256(image).hexdigest(), progress=interrupt)
+assert reader.offset == 1500
+assert reader.download(imagePath, hashlib.sha256(image).hexdigest())
+with open(imagePath, "rb") as f:
+    assert f.read() == image
+assert reader.close() == 0
+module.offerHostImage(image)
+reader = HostImageReader(el, chunkSize=300)
+assert reader.accept() == 0 and reader.seek(0)
+copy = io.BytesIO()
+assert reader.transfer(copy) and copy.getvalue() == image
+assert reader.close() == 0
+print("host image read at " + str(int(reader.bytesPerSecond)) + " bytes/s")
+
+# only fields that moved beyond their deadband are reported
+delta = ReportDelta(deadbands={"tempf": 0.5, "winddir": 10.0}, periods={"winddir": 360}, fullInterval=60.0)
+assert delta.update({"tempf": 70.0, "winddir": 355.0, "rain": 0.0}, now=0.0) == {"tempf": 70.0, "winddir": 355.0, "rain": 0.0}
+assert delta.update({"tempf": 70.3, "winddir": 4.0, "rain": 0.0}, now=10.0) == {}
+assert delta.update({"tempf": 70.6, "winddir": 30.0, "rain": 0.0}, now=20.0) == {"tempf": 70.6, "winddir": 30.0}
+assert len(delta.update({"tempf": 70.6, "winddir": 30.0, "rain": 0.0}, now=60.0)) == 3
+assert delta.update({"tempf": 71.2, "winddir": 30.0, "rain": 0.0}, now=70.0, pending=True) == {"tempf": 71.2}
+assert delta.update({"tempf": 71.2, "winddir": 30.0, "rain": 0.0}, now=80.0, pending=True) == {}
+delta.commit()
+assert delta.update({"tempf": 71.2, "winddir": 30.0, "rain": 0.0}, now=90.0) == {}
+# queued reports are compared against each other, and committed together
+assert delta.update({"tempf": 72.0, "winddir": 30.0, "rain": 0.0}, now=100.0, pending=True) == {"tempf": 72.0}
+assert delta.update({"tempf": 71.4, "winddir": 30.0, "rain": 0.0}, now=110.0, pending=True) == {"tempf": 71.4}
+assert delta.update({"tempf": 71.4, "winddir": 45.0, "rain": 0.0}, now=115.0, pending=True) == {"winddir": 45.0}
+delta.commit()
+assert delta.state["tempf"] == 71.4 and delta.state["winddir"] == 45.0
+assert delta.update({"tempf": 71.4, "winddir": 45.0, "rain": 0.0}, now=118.0) == {}
+
+# a recorded session plays back to the driver byte for byte
+recording = io.BytesIO()
+recorded = RecordingPort(SimulatedPort(module), recording)
+session = ExpressLink(recorded)
+answers = [session.sendCommand("AT"), session.sendCommand("AT+CONF? ThingName"), session.publish(1, b"recorded")]
+recording.seek(0)
+replay = ReplayPort(recording, speed=0)
+session = ExpressLink(replay)
+assert [session.sendCommand("AT"), session.sendCommand("AT+CONF? ThingName"), session.publish(1, b"recorded")] == answers
+assert replay.mismatches == 0 and replay.finished
+print("recorded session replayed")
+
+# the same module over a pseudo terminal, read back through the pty
+server = PtySimulator(ModuleSimulator(latency=0.001))
+server.start()
+fd = os.open(server.port_name, os.O_RDWR | os.O_NOCTTY)
+os.write(fd, b"AT\n")
+assert os.read(fd, 64) == b"OK\r\n"
+os.close(fd)
+server.stop()
+print("pty simulator answered")
+
+print("all checks passed")
@@ -0,0 +1,137 @@
+import threading
+from collections import deque
+from concurrent.futures import Future
+from expresslink import ExpressLink, Response
+
+# Lanes in the order they are served. A queued command in a lower lane is only
+# written when every higher lane is empty, so a heartbeat submitted with
+# PRIORITY_HIGH goes out next even behind a long backlog of PRIORITY_BULK data.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+LANES = 3
+
+# Thread-safe front end for ExpressLink on CPython hosts such as a Raspberry
+# Pi gateway. One writer thread owns the port and runs the queued work in
+# priority order. Any thread may submit and wait on the returned
+# concurrent.futures.Future. maxQueued bounds each lane: a producer that
+# outruns the module blocks in submit() until there is room, or gets a
+# RuntimeError when its wait times out.
+class ThreadedExpressLink:
+    el:ExpressLink
+    maxQueued:int
+    _lanes:list
+    _lock:threading.Lock
+    _ready:threading.Condition
+    _space:threading.Condition
+    _thread:threading.Thread
+    _running:bool
+
+    def __init__(self, el:ExpressLink, maxQueued:int=64):
+        self.el = el
+        self.maxQueued = maxQueued
+        self._lanes = [deque() for _ in range(LANES)]
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._space = threading.Condition(self._lock)
+        self._thread = None
+        self._running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="expresslink-writer", daemon=True)
+        self._thread.start()
+
+    # Stop the writer thread once the queued work is done. With drain False
+    # the queued work is cancelled instead.
+    def stop(self, drain:bool=True):
+        with self._lock:
+            if not drain:
+                for lane in self._lanes:
+                    while lane:
+                        lane.popleft()[0].cancel()
+            self._running = False
+            self._ready.notify_all()
+            self._space.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def pending(self)->int:
+        with self._lock:
+            return sum(len(lane) for lane in self._lanes)
+
+    # Queue function(*args) to run on the writer thread with the driver to
+    # itself. Returns a Future for its result. block and waitTimeout control
+    # the wait for room in a full lane.
+    def call(self, function, *args, priority:int=PRIORITY_NORMAL, block:bool=True, waitTimeout:float=None)->Future:
+        if not 0 <= priority < LANES:
+            raise ValueError("priority out of range")
+        future = Future()
+        with self._lock:
+            if not self._running:
+                raise RuntimeError("writer thread not running")
+            lane = self._lanes[priority]
+            if len(lane) >= self.maxQueued:
+                if not block or not self._space.wait_for(
+                        lambda: len(lane) < self.maxQueued or not self._running, waitTimeout):
+                    raise RuntimeError("expresslink queue full")
+                if not self._running:
+                    raise RuntimeError("writer thread not running")
+            lane.append((future, function, args))
+            self._ready.notify()
+        return future
+
+    # queue a command, the Future resolves to its Response
+    def submit(self, command:str, timeout:float=None, priority:int=PRIORITY_NORMAL, block:bool=True, waitTimeout:float=None)->Future:
+        return self.call(self.el.request, command, timeout, priority=priority, block=block, waitTimeout=waitTimeout)
+
+    # queue ExpressLink.publish(), the Future resolves to its checkResponse code
+    def publish(self, topicIndex:int, payload, priority:int=PRIORITY_NORMAL, block:bool=True, waitTimeout:float=None)->Future:
+        return self.call(self.el.publish, topicIndex, payload, priority=priority, block=block, waitTimeout=waitTimeout)
+
+    # blocking forms for callers that want the answer straight away
+    def request(self, command:str, timeout:float=None, priority:int=PRIORITY_NORMAL)->Response:
+        return self.submit(command, timeout, priority).result()
+
+    def sendCommand(self, command:str, timeout:float=None, priority:int=PRIORITY_NORMAL)->str:
+        return self.request(command, timeout, priority).line
+
+    def connect(self, priority:int=PRIORITY_NORMAL)->bool:
+        return self.call(self.el.connect, priority=priority).result()
+
+    def _next(self):
+        with self._lock:
+            while True:
+                for lane in self._lanes:
+                    if lane:
+                        work = lane.popleft()
+                        # waiters may be blocked on different lanes
+                        self._space.notify_all()
+                        return work
+                if not self._running:
+                    return None
+                self._ready.wait()
+
+    def _run(self):
+        while True:
+            work = self._next()
+            if work is None:
+                return
+            future, function, args = work
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(*args))
+            except BaseException as e:
+                future.set_exception(e)
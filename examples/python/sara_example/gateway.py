@@ -0,0 +1,189 @@
+import time
+import asyncio
+from expresslink import ExpressLink, ERR_NO_CONNECTION, BOOT_TIMEOUT
+from expresslink_async import AsyncExpressLink
+from store_forward import RETRY_RESULTS
+
+# One module on a gateway and its health record
+class GatewayModule:
+    name:str
+    ael:AsyncExpressLink
+    healthy:bool
+    failures:int
+    inFlight:int
+    sent:int
+    errors:int
+    failovers:int
+    payloadBytes:int
+    retryAt:float
+
+    def __init__(self, name:str, el:ExpressLink, pollInterval:float):
+        self.name = name
+        self.ael = AsyncExpressLink(el, pollInterval)
+        self.healthy = False
+        self.failures = 0
+        self.inFlight = 0
+        self.sent = 0
+        self.errors = 0
+        self.failovers = 0
+        self.payloadBytes = 0
+        self.retryAt = 0.0
+
+    def metrics(self)->dict:
+        return {
+            "healthy": self.healthy,
+            "in_flight": self.inFlight,
+            "sent": self.sent,
+            "errors": self.errors,
+            "failovers": self.failovers,
+            "payload_bytes": self.payloadBytes,
+        }
+
+# Drives several ExpressLink modules, each on its own serial port, from one
+# asyncio loop. Every module needs the same topic configuration, a publish
+# goes to the healthy module with the fewest commands waiting on it.
+# A module that times out or reports the connection lost maxFailures times
+# in a row is taken out of rotation and its publishes move to the others.
+# maintain() reconnects it after retryDelay seconds.
+class ModuleGateway:
+    modules:list
+    maxFailures:int
+    retryDelay:float
+    attempts:int
+    pollInterval:float
+    started:float
+    published:int
+    failed:int
+    _next:int
+    _monitor:object
+
+    def __init__(self, maxFailures:int=3, retryDelay:float=30.0, attempts:int=2, pollInterval:float=0.005):
+        self.modules = []
+        self.maxFailures = maxFailures
+        self.retryDelay = retryDelay
+        self.attempts = attempts
+        self.pollInterval = pollInterval
+        self.started = time.monotonic()
+        self.published = 0
+        self.failed = 0
+        self._next = 0
+        self._monitor = None
+
+    def add(self, el:ExpressLink, name:str=None)->GatewayModule:
+        if name is None:
+            name = "module" + str(len(self.modules))
+        module = GatewayModule(name, el, self.pollInterval)
+        self.modules.append(module)
+        return module
+
+    # start and connect every module concurrently, returns how many came up
+    async def begin(self, timeout:float=BOOT_TIMEOUT)->int:
+        results = await asyncio.gather(*[self._bringUp(m, timeout) for m in self.modules])
+        self.started = time.monotonic()
+        return sum(1 for up in results if up)
+
+    async def _bringUp(self, module:GatewayModule, timeout:float)->bool:
+        if await module.ael.begin(timeout) and await module.ael.connect():
+            module.healthy = True
+            module.failures = 0
+        else:
+            self._markDown(module)
+        return module.healthy
+
+    def _markDown(self, module:GatewayModule):
+        module.healthy = False
+        module.retryAt = time.monotonic() + self.retryDelay
+
+    # the healthy module with the least work waiting, in turn on a tie
+    def _pick(self, exclude):
+        best = None
+        count = len(self.modules)
+        for i in range(count):
+            module = self.modules[(self._next + i) % count]
+            if not module.healthy or module in exclude:
+                continue
+            if best is None or module.inFlight < best.inFlight:
+                best = module
+        if best is not None:
+            self._next = (self.modules.index(best) + 1) % count
+        return best
+
+    # Publish on topicIndex through the least loaded module. Returns the
+    # checkResponse code of the last attempt, -1 when no module is healthy.
+    async def publish(self, topicIndex:int, payload:str)->int:
+        tried = []
+        code = -1
+        for _ in range(self.attempts):
+            module = self._pick(tried)
+            if module is None:
+                break
+            if tried:
+                module.failovers += 1
+            tried.append(module)
+            module.inFlight += 1
+            try:
+                code = await module.ael.publish(topicIndex, payload)
+            finally:
+                module.inFlight -= 1
+            if code == 0:
+                module.failures = 0
+                module.sent += 1
+                module.payloadBytes += len(payload)
+                self.published += 1
+                return 0
+            module.errors += 1
+            if code not in RETRY_RESULTS:
+                # the message itself was refused, another module would too
+                break
+            module.failures += 1
+            if code == ERR_NO_CONNECTION or module.failures >= self.maxFailures:
+                self._markDown(module)
+        self.failed += 1
+        return code
+
+    # reconnect the modules that are out of rotation and due for a retry
+    async def maintain(self)->int:
+        now = time.monotonic()
+        due = [m for m in self.modules if not m.healthy and now >= m.retryAt]
+        results = await asyncio.gather(*[self._reconnect(m) for m in due])
+        return sum(1 for up in results if up)
+
+    async def _reconnect(self, module:GatewayModule)->bool:
+        if await module.ael.connect():
+            module.healthy = True
+            module.failures = 0
+        else:
+            self._markDown(module)
+        return module.healthy
+
+    async def _maintainLoop(self, interval:float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.maintain()
+
+    # run maintain() every interval seconds in a background task
+    def startMonitor(self, interval:float=5.0):
+        if self._monitor is None:
+            self._monitor = asyncio.ensure_future(self._maintainLoop(interval))
+
+    def stopMonitor(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+
+    def healthy(self)->int:
+        return sum(1 for m in self.modules if m.healthy)
+
+    def metrics(self)->dict:
+        elapsed = time.monotonic() - self.started
+        modules = {}
+        for module in self.modules:
+            modules[module.name] = module.metrics()
+        return {
+            "published": self.published,
+            "failed": self.failed,
+            "healthy": self.healthy(),
+            "messages_per_second": self.published / elapsed if elapsed > 0 else 0.0,
+            "payload_bytes_per_second": sum(m.payloadBytes for m in self.modules) / elapsed if elapsed > 0 else 0.0,
+            "modules": modules,
+        }
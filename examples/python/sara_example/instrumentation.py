@@ -0,0 +1,113 @@
+# Optional counters for the ExpressLink driver. Attach with
+#   el.instrumentation = Instrumentation()
+# and publish el.stats() as a periodic health message.
+
+# upper bounds of the latency histogram buckets in milliseconds, the last
+# bucket counts everything slower
+LATENCY_BUCKETS_MS = (5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+# "AT+SEND1 data" -> "AT+SEND", "AT+CONF? ThingName" -> "AT+CONF?"
+def commandKind(command)->str:
+    if not isinstance(command, str):
+        command = bytes(command[:24]).decode("utf-8", "replace")
+    end = 0
+    while end < len(command) and command[end] != " " and not (end > 2 and command[end].isdigit()):
+        end += 1
+    return command[:end]
+
+# the sample below which fraction of the samples lie, 0.0 for no samples
+def percentile(samples:list, fraction:float)->float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class CommandStats:
+    count:int
+    errors:int
+    timeouts:int
+    totalTime:float
+    maxTime:float
+    histogram:list
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.totalTime = 0.0
+        self.maxTime = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def snapshot(self)->dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "avg_ms": (self.totalTime * 1000.0 / self.count) if self.count else 0.0,
+            "max_ms": self.maxTime * 1000.0,
+            "histogram": list(self.histogram),
+        }
+
+class Instrumentation:
+    commands:dict
+    errorCodes:dict
+    bytesWritten:int
+    bytesRead:int
+    reconnects:int
+    reconnectFailures:int
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.commands = {}
+        self.errorCodes = {}
+        self.bytesWritten = 0
+        self.bytesRead = 0
+        self.reconnects = 0
+        self.reconnectFailures = 0
+
+    # code follows checkResponse, a timeout is a -1 with no response at all
+    def record(self, command, latency:float, code:int, timedOut:bool=False):
+        kind = commandKind(command)
+        stats = self.commands.get(kind)
+        if stats is None:
+            stats = CommandStats()
+            self.commands[kind] = stats
+        stats.count += 1
+        stats.totalTime += latency
+        if latency > stats.maxTime:
+            stats.maxTime = latency
+        ms = latency * 1000.0
+        bucket = 0
+        while bucket < len(LATENCY_BUCKETS_MS) and ms > LATENCY_BUCKETS_MS[bucket]:
+            bucket += 1
+        stats.histogram[bucket] += 1
+        if timedOut:
+            stats.timeouts += 1
+        elif code != 0:
+            stats.errors += 1
+            self.errorCodes[code] = self.errorCodes.get(code, 0) + 1
+
+    def reconnect(self, success:bool):
+        if success:
+            self.reconnects += 1
+        else:
+            self.reconnectFailures += 1
+
+    def snapshot(self)->dict:
+        commands = {}
+        for kind, stats in self.commands.items():
+            commands[kind] = stats.snapshot()
+        errorCodes = {}
+        for code, count in self.errorCodes.items():
+            errorCodes[str(code)] = count
+        return {
+            "commands": commands,
+            "error_codes": errorCodes,
+            "bytes_written": self.bytesWritten,
+            "bytes_read": self.bytesRead,
+            "reconnects": self.reconnects,
+            "reconnect_failures": self.reconnectFailures,
+            "latency_buckets_ms": list(LATENCY_BUCKETS_MS),
+        }
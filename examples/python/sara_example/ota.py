@@ -0,0 +1,206 @@
+import os
+import time
+from expresslink import ExpressLink
+try:
+    import hashlib
+except ImportError:
+    # CircuitPython builds without hashlib, use adafruit_hashlib if it is there
+    try:
+        import adafruit_hashlib as hashlib
+    except ImportError:
+        hashlib = None
+
+# AT+OTA? states
+OTA_NONE = 0
+OTA_MODULE_PROPOSED = 1
+OTA_HOST_PROPOSED = 2
+OTA_IN_PROGRESS = 3
+OTA_MODULE_READY = 4
+OTA_HOST_READY = 5
+
+# hex digit value of an ASCII code, -1 for anything else
+def _hexValue(c:int)->int:
+    if 48 <= c <= 57:
+        return c - 48
+    c |= 32
+    if 97 <= c <= 102:
+        return c - 87
+    return -1
+
+# Streams a host image out of the module once the module has downloaded and
+# verified it (AT+OTA? reports OTA_HOST_READY). Each AT+OTA READ goes through
+# the allocation free execute() path and is decoded straight from the receive
+# buffer into one preallocated chunk buffer, which is handed to the sink as a
+# memoryview. A response line carries the chunk as hex, so chunkSize must be
+# less than half the driver's rxSize.
+class HostImageReader:
+    el:ExpressLink
+    chunkSize:int
+    retries:int
+    buffer:bytearray
+    view:memoryview
+    offset:int
+    size:int
+    elapsed:float
+    bytesPerSecond:float
+    lastCode:int
+    _readCommand:bytes
+
+    def __init__(self, el:ExpressLink, chunkSize:int=256, retries:int=3):
+        if chunkSize * 2 + 16 > len(el._rxBuf):
+            raise ValueError("chunkSize too large for the driver receive buffer")
+        self.el = el
+        self.chunkSize = chunkSize
+        self.retries = retries
+        self.buffer = bytearray(chunkSize)
+        self.view = memoryview(self.buffer)
+        self.offset = 0
+        self.size = 0
+        self.elapsed = 0.0
+        self.bytesPerSecond = 0.0
+        self.lastCode = 0
+        self._readCommand = ("AT+OTA READ " + str(chunkSize)).encode("utf-8")
+
+    # (state, detail) from AT+OTA?, state -1 when the module did not answer
+    def state(self)->tuple:
+        response = self.el.request("AT+OTA?")
+        if not response.ok:
+            return (-1, "")
+        parts = response.payload.split(" ", 1)
+        if not parts[0].isdigit():
+            return (-1, "")
+        return (int(parts[0]), parts[1] if len(parts) > 1 else "")
+
+    def accept(self)->int:
+        return self.el.checkResponse(self.el.sendCommand("AT+OTA ACCEPT"))
+
+    # tell the module the host is done with the image
+    def close(self)->int:
+        return self.el.checkResponse(self.el.sendCommand("AT+OTA CLOSE"))
+
+    # drop the image, e.g. after a failed verification
+    def flush(self)->int:
+        return self.el.checkResponse(self.el.sendCommand("AT+OTA FLUSH"))
+
+    def seek(self, offset:int)->bool:
+        self.lastCode = self.el.checkResponse(self.el.sendCommand("AT+OTA SEEK " + str(offset)))
+        if self.lastCode != 0:
+            return False
+        self.offset = offset
+        return True
+
+    # Read the next chunk into self.buffer, returns the byte count (0 at the
+    # end of the image) or -1 on an error or garbled response.
+    def readChunk(self)->int:
+        count = self.chunkSize
+        if self.size:
+            count = min(count, self.size - self.offset)
+            if count <= 0:
+                return 0
+        command = self._readCommand
+        if count != self.chunkSize:
+            command = "AT+OTA READ " + str(count)
+        self.lastCode = self.el.execute(command)
+        if self.lastCode != 0:
+            return -1
+        # the response is "{count} {hex}", the data itself gives the length
+        data = self.el.payload
+        i = 0
+        end = len(data)
+        while i < end and data[i] != 32:
+            i += 1
+        i += 1
+        if i >= end:
+            # "0" on its own, nothing left to read
+            return 0
+        if end - i > 2 * len(self.buffer) or (end - i) % 2:
+            return -1
+        buf = self.buffer
+        n = 0
+        while i < end:
+            high = _hexValue(data[i])
+            low = _hexValue(data[i + 1])
+            if high < 0 or low < 0:
+                return -1
+            buf[n] = (high << 4) | low
+            n += 1
+            i += 2
+        self.offset += n
+        return n
+
+    # Copy the image from the current offset into sink (anything with a write
+    # method taking a memoryview), feeding hasher on the way. progress is
+    # called as progress(offset, size, bytesPerSecond) after every chunk.
+    # A failed read is retried from the same offset. Returns False when the
+    # transfer could not be completed, self.offset then tells where to resume.
+    def transfer(self, sink, hasher=None, progress=None)->bool:
+        start = time.monotonic()
+        first = self.offset
+        failures = 0
+        while True:
+            if failures:
+                if failures > self.retries:
+                    return False
+                # the module pointer may have moved, put it back
+                if not self.seek(self.offset):
+                    failures += 1
+                    continue
+            count = self.readChunk()
+            if count == 0:
+                break
+            if count < 0:
+                failures += 1
+                continue
+            failures = 0
+            chunk = self.view[0:count]
+            sink.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+            self.elapsed = time.monotonic() - start
+            if self.elapsed > 0:
+                self.bytesPerSecond = (self.offset - first) / self.elapsed
+            if progress is not None:
+                progress(self.offset, self.size, self.bytesPerSecond)
+        return True
+
+    # Save the ready host image to path and check it against expectedDigest,
+    # a hex string of the algorithm's digest, when one is given. With resume
+    # an existing partial file is kept and the download continues after it.
+    # Returns True when the whole image is on file and the digest matches.
+    def download(self, path:str, expectedDigest:str=None, algorithm:str="sha256", resume:bool=True, progress=None)->bool:
+        state, detail = self.state()
+        if state != OTA_HOST_READY:
+            self.lastCode = -1
+            return False
+        self.size = int(detail) if detail.isdigit() else 0
+        hasher = None
+        if expectedDigest is not None:
+            if hashlib is None:
+                raise RuntimeError("no hashlib to verify the image with")
+            hasher = hashlib.new(algorithm)
+        offset = 0
+        if resume:
+            try:
+                offset = os.stat(path)[6]
+            except OSError:
+                offset = 0
+            if self.size and offset > self.size:
+                offset = 0
+        if offset and hasher is not None:
+            # the hash of the part already on file has to be rebuilt
+            with open(path, "rb") as f:
+                while True:
+                    count = f.readinto(self.buffer)
+                    if not count:
+                        break
+                    hasher.update(self.view[0:count])
+        if not self.seek(offset):
+            return False
+        with open(path, "ab" if offset else "wb") as f:
+            if not self.transfer(f, hasher, progress):
+                return False
+        if self.size and self.offset != self.size:
+            return False
+        if hasher is not None and hasher.hexdigest().lower() != expectedDigest.lower():
+            return False
+        return True
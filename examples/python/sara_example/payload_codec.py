@@ -0,0 +1,85 @@
+import json
+import struct
+import binascii
+
+# Payload encoders turn a report dictionary into the text sent with AT+SEND.
+# Every encoder has encode(report)->str.
+
+class JsonEncoder:
+    def encode(self, report:dict)->str:
+        return json.dumps(report)
+
+# Encodes reports as CBOR (RFC 8949) in base64, AT+SEND payloads cannot carry
+# raw binary. Floats are sent as single precision, which is all the precision
+# CircuitPython floats have.
+# With a key dictionary, keys found in it are sent as their index in the
+# dictionary instead of their name. The cloud side needs the same dictionary,
+# see cloud_templates/aws_cdk/PayloadDecoderPattern.
+class CborEncoder:
+    keys:tuple
+    _index:dict
+
+    def __init__(self, keys=None):
+        self.keys = () if keys is None else tuple(keys)
+        self._index = {}
+        for i, key in enumerate(self.keys):
+            self._index[key] = i
+
+    def encode(self, report:dict)->str:
+        return binascii.b2a_base64(self.encodeBinary(report)).decode("utf-8").strip()
+
+    def encodeBinary(self, report:dict)->bytes:
+        buf = bytearray()
+        self._item(buf, report)
+        return bytes(buf)
+
+    def _head(self, buf:bytearray, major:int, value:int):
+        major <<= 5
+        if value < 24:
+            buf.append(major | value)
+        elif value < 0x100:
+            buf.append(major | 24)
+            buf.append(value)
+        elif value < 0x10000:
+            buf.append(major | 25)
+            buf.extend(struct.pack(">H", value))
+        elif value < 0x100000000:
+            buf.append(major | 26)
+            buf.extend(struct.pack(">I", value))
+        else:
+            buf.append(major | 27)
+            buf.extend(struct.pack(">Q", value))
+
+    def _item(self, buf:bytearray, value):
+        if value is None:
+            buf.append(0xf6)
+        elif value is True:
+            buf.append(0xf5)
+        elif value is False:
+            buf.append(0xf4)
+        elif isinstance(value, int):
+            if value >= 0:
+                self._head(buf, 0, value)
+            else:
+                self._head(buf, 1, -1 - value)
+        elif isinstance(value, float):
+            buf.append(0xfa)
+            buf.extend(struct.pack(">f", value))
+        elif isinstance(value, str):
+            data = value.encode("utf-8")
+            self._head(buf, 3, len(data))
+            buf.extend(data)
+        elif isinstance(value, (bytes, bytearray)):
+            self._head(buf, 2, len(value))
+            buf.extend(value)
+        elif isinstance(value, (list, tuple)):
+            self._head(buf, 4, len(value))
+            for item in value:
+                self._item(buf, item)
+        elif isinstance(value, dict):
+            self._head(buf, 5, len(value))
+            for key, item in value.items():
+                self._item(buf, self._index.get(key, key))
+                self._item(buf, item)
+        else:
+            raise TypeError("cannot encode " + str(type(value)))
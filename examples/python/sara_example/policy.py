@@ -0,0 +1,98 @@
+import time
+from expresslink import ExpressLink, Response, ERR_NO_CONNECTION, ERR_NOT_ALLOWED
+
+# What to do about a failed command
+FAIL = 0      # hand the error to the caller
+RETRY = 1     # send the command again after the delay
+RECONNECT = 2 # connect first, then send it again
+
+ANY = None    # matches every failure
+TIMEOUT = -1  # no response within the command's deadline
+
+# (command prefix, result code, action, retries, delay in seconds), the first
+# row matching the command and its checkResponse code applies. Response
+# deadlines themselves come from COMMAND_TIMEOUTS in expresslink.py.
+DEFAULT_POLICY = (
+    # the module has no busy error, NOT ALLOWED is what it says while it is
+    # connecting or applying an update
+    ("AT+SEND", ERR_NOT_ALLOWED, RETRY, 2, 0.5),
+    ("AT+SEND", ERR_NO_CONNECTION, RECONNECT, 1, 0.0),
+    # the message may have gone out with only the response lost, resending
+    # could publish it twice
+    ("AT+SEND", TIMEOUT, FAIL, 0, 0.0),
+    ("AT+SUBSCRIBE", ERR_NO_CONNECTION, RECONNECT, 1, 0.0),
+    ("AT+SHADOW", ERR_NO_CONNECTION, RECONNECT, 1, 0.0),
+    # spacing out connection attempts is reconnect.py's job
+    ("AT+CONNECT", ANY, FAIL, 0, 0.0),
+    # these take data out of the module, a reply lost to the timeout cannot
+    # be asked for again
+    ("AT+GET", TIMEOUT, FAIL, 0, 0.0),
+    ("AT+OTA READ", TIMEOUT, FAIL, 0, 0.0),
+    ("AT", ERR_NOT_ALLOWED, RETRY, 2, 1.0),
+    ("AT", TIMEOUT, RETRY, 1, 0.1),
+    # overflow, parse, parameter and the other errors come back the same way
+    ("AT", ANY, FAIL, 0, 0.0),
+)
+
+# Sends commands and handles their failures as the policy table says.
+# reconnect is called for RECONNECT and returns True once connected, by
+# default el.connect; pass a ReconnectScheduler's connect to respect its
+# backoff.
+class CommandPolicy:
+    el:ExpressLink
+    table:tuple
+    reconnect:object
+    retries:int
+    reconnects:int
+
+    def __init__(self, el:ExpressLink, table:tuple=DEFAULT_POLICY, reconnect=None):
+        self.el = el
+        self.table = table
+        self.reconnect = el.connect if reconnect is None else reconnect
+        self.retries = 0
+        self.reconnects = 0
+
+    # (action, retries, delay) for a command that failed with code
+    def lookup(self, command:str, code:int)->tuple:
+        for prefix, match, action, retries, delay in self.table:
+            if command.startswith(prefix) and (match is ANY or match == code):
+                return (action, retries, delay)
+        return (FAIL, 0, 0.0)
+
+    # Decide whether to try again after a failure, doing the reconnect or
+    # waiting the delay first. attempt counts the retries made so far.
+    def _again(self, command:str, code:int, attempt:int)->bool:
+        action, retries, delay = self.lookup(command, code)
+        if action == FAIL or attempt >= retries:
+            return False
+        if action == RECONNECT:
+            if not self.reconnect():
+                return False
+            self.reconnects += 1
+        if delay:
+            time.sleep(delay)
+        # a late response to a timed out try is dropped by the driver before
+        # the retry is written
+        self.retries += 1
+        return True
+
+    def request(self, command:str, timeout:float=None)->Response:
+        attempt = 0
+        while True:
+            response = self.el.request(command, timeout)
+            if response.code == 0 or not self._again(command, response.code, attempt):
+                return response
+            attempt += 1
+
+    def sendCommand(self, command:str, timeout:float=None)->str:
+        return self.request(command, timeout).line
+
+    # ExpressLink.publish() under the policy, returns the checkResponse code
+    def publish(self, topicIndex:int, payload, length:int=None)->int:
+        command = "AT+SEND" + str(topicIndex)
+        attempt = 0
+        while True:
+            code = self.el.publish(topicIndex, payload, length)
+            if code == 0 or not self._again(command, code, attempt):
+                return code
+            attempt += 1
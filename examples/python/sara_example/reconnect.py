@@ -0,0 +1,60 @@
+import time
+import random
+from expresslink import ExpressLink, ERR_NOT_ALLOWED
+
+# Spaces out AT+CONNECT attempts with exponential backoff. The delay doubles
+# after every failed attempt up to cap and returns to base after a success.
+# Each delay is shortened by a random part of up to jitter times its length,
+# so a fleet of stations does not retry in step after an outage.
+class ReconnectScheduler:
+    el:ExpressLink
+    base:float
+    cap:float
+    factor:float
+    jitter:float
+    failures:int
+    delay:float
+    _nextAttempt:float
+
+    def __init__(self, el:ExpressLink, base:float=2.0, cap:float=600.0, factor:float=2.0, jitter:float=0.5):
+        self.el = el
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+        self.jitter = jitter
+        self.reset()
+
+    def reset(self):
+        self.failures = 0
+        self.delay = 0.0
+        self._nextAttempt = 0.0
+
+    # True when connect() would talk to the module
+    def ready(self)->bool:
+        return self.el._connected or time.monotonic() >= self._nextAttempt
+
+    # seconds until the next attempt is allowed
+    def remaining(self)->float:
+        return max(0.0, self._nextAttempt - time.monotonic())
+
+    # Connect unless the backoff delay is still running. Never blocks while
+    # waiting, it returns False instead.
+    def connect(self)->bool:
+        if not self.ready():
+            return False
+        if self.el.connect():
+            self.reset()
+            return True
+        self._scheduleRetry(self.el.lastConnectCode)
+        return False
+
+    def _scheduleRetry(self, code:int):
+        self.failures += 1
+        if code == ERR_NOT_ALLOWED:
+            # the module refuses to connect (e.g. in configuration mode),
+            # retrying soon will not change that
+            delay = self.cap
+        else:
+            delay = min(self.cap, self.base * (self.factor ** (self.failures - 1)))
+        self.delay = delay * (1.0 - self.jitter * random.random())
+        self._nextAttempt = time.monotonic() + self.delay
@@ -0,0 +1,102 @@
+import json
+import time
+from expresslink import ExpressLink
+
+# Keeps the last reported value of every report field and passes on only
+# the fields that moved by more than their deadband since they were last
+# reported. Fields without a deadband use default, 0.0 reports any change.
+# periods marks circular fields, e.g. {"winddir": 360} makes 355 to 5
+# a change of 10. Every fullInterval seconds, and after resync(), the whole
+# report goes out so the cloud copy cannot drift.
+# update(report, pending=True) is for reports that are queued before they
+# are sent. Their changes are compared against as if reported, and recorded
+# all together once commit() is called after the module accepted them. Call
+# resync() when a queued report is lost.
+class ReportDelta:
+    deadbands:dict
+    default:float
+    periods:dict
+    fullInterval:float
+    state:dict
+    fullReports:int
+    fieldsSent:int
+    fieldsSkipped:int
+    _lastFull:float
+    _pending:dict
+    _pendingFull:float
+
+    def __init__(self, deadbands=None, default:float=0.0, periods=None, fullInterval:float=3600.0):
+        self.deadbands = {} if deadbands is None else deadbands
+        self.default = default
+        self.periods = {} if periods is None else periods
+        self.fullInterval = fullInterval
+        self.fullReports = 0
+        self.fieldsSent = 0
+        self.fieldsSkipped = 0
+        self.resync()
+
+    # forget the reported state, the next update() returns the full report
+    def resync(self):
+        self.state = {}
+        self._lastFull = 0.0
+        self._pending = {}
+        self._pendingFull = None
+
+    def _moved(self, key:str, old, new)->bool:
+        if isinstance(new, bool) or not isinstance(new, (int, float)) or not isinstance(old, (int, float)):
+            return new != old
+        difference = abs(new - old)
+        period = self.periods.get(key)
+        if period:
+            difference %= period
+            difference = min(difference, period - difference)
+        return difference > self.deadbands.get(key, self.default)
+
+    # Return the part of report that has to be sent, an empty dict when
+    # nothing moved enough. It is recorded as reported straight away unless
+    # pending is True.
+    def update(self, report:dict, now:float=None, pending:bool=False)->dict:
+        if now is None:
+            now = time.monotonic()
+        lastFull = self._lastFull if self._pendingFull is None else self._pendingFull
+        if not self.state and not self._pending or now - lastFull >= self.fullInterval:
+            self._pendingFull = now
+            self.fullReports += 1
+            changes = dict(report)
+        else:
+            changes = {}
+            for key, value in report.items():
+                if key in self._pending:
+                    old = self._pending[key]
+                elif key in self.state:
+                    old = self.state[key]
+                else:
+                    changes[key] = value
+                    continue
+                if self._moved(key, old, value):
+                    changes[key] = value
+        self.fieldsSent += len(changes)
+        self.fieldsSkipped += len(report) - len(changes)
+        self._pending.update(changes)
+        if not pending:
+            self.commit()
+        return changes
+
+    # record the changes of every update() since the last commit as reported
+    def commit(self):
+        self.state.update(self._pending)
+        self._pending = {}
+        if self._pendingFull is not None:
+            self._lastFull = self._pendingFull
+            self._pendingFull = None
+
+# the device shadow document reporting fields
+def shadowDocument(fields:dict)->str:
+    return json.dumps({"state": {"reported": fields}})
+
+# Report fields in the device shadow, or in a named shadow by its index.
+# Needs shadow support enabled in the module configuration. Returns the
+# checkResponse code.
+def updateShadow(el:ExpressLink, fields:dict, index:int=None)->int:
+    command = "AT+SHADOW" + ("" if index is None else str(index)) + " UPDATE " + shadowDocument(fields)
+    return el.checkResponse(el.sendCommand(command))
@@ -71,8 +71,19 @@ direction = [  350.0,350.0,350.0,350.0,350.0,350.0,350.0,350.0,350.0,350.0,
 
 ws= weather_station()
 
+speeds = []
 for d in direction:
-    ws.addWind( random.random() * 50.0, d )
+    speed = random.random() * 50.0
+    speeds.append(speed)
+    ws.addWind( speed, d )
+
+# the 2 minute averages are rolling averages of the last 120 samples
+assert abs(ws.wind2MinAverageMPH - sum(speeds[-120:]) / 120) < 0.001
+
+wrap = weather_station()
+for i in range(240):
+    wrap.addWind( 5.0, 350.0 if i % 2 else 10.0 )
+assert min(wrap.wind2MinAverageDirection, 360.0 - wrap.wind2MinAverageDirection) < 0.5
 
 print("gust speed " + str(ws.windGust1minSpeed))
 print("gust direction " + str(ws.windGust1minDirection))
@@ -0,0 +1,207 @@
+import struct
+from expresslink import ExpressLink, SEND_WINDOW, ERR_NO_CONNECTION, ERR_TOPIC_OUT_OF_RANGE, ERR_NOT_ALLOWED
+
+# What a full store does with a new payload
+DROP_OLDEST = 0 # overwrite the oldest stored payload
+DROP_NEWEST = 1 # refuse the new payload
+
+# Results that mean the payload may still go through later: no response, no
+# connection, a topic not configured yet, or NOT ALLOWED while the module is
+# busy connecting or updating. Any other error (overflow, parse or parameter
+# errors) will fail again, so those payloads are dropped and counted in the
+# store's dropped.
+RETRY_RESULTS = (-1, ERR_NO_CONNECTION, ERR_TOPIC_OUT_OF_RANGE, ERR_NOT_ALLOWED)
+
+# Bounded in-RAM ring of payloads. Lost on reset but costs no flash writes.
+class RamRing:
+    capacity:int
+    policy:int
+    dropped:int
+    _items:list
+    _head:int
+    _count:int
+
+    def __init__(self, capacity:int, policy:int=DROP_OLDEST):
+        self.capacity = capacity
+        self.policy = policy
+        self.dropped = 0
+        self._items = [None] * capacity
+        self._head = 0
+        self._count = 0
+
+    def __len__(self)->int:
+        return self._count
+
+    def push(self, payload:str)->bool:
+        if self._count == self.capacity:
+            self.dropped += 1
+            if self.policy == DROP_NEWEST:
+                return False
+            self.drop(1)
+        self._items[(self._head + self._count) % self.capacity] = payload
+        self._count += 1
+        return True
+
+    def peek(self, count:int)->list:
+        count = min(count, self._count)
+        return [self._items[(self._head + i) % self.capacity] for i in range(count)]
+
+    def drop(self, count:int):
+        count = min(count, self._count)
+        for _ in range(count):
+            self._items[self._head] = None
+            self._head = (self._head + 1) % self.capacity
+        self._count -= count
+
+# Bounded ring of payloads in a file of fixed size slots, so stored reports
+# survive a reset. On CircuitPython the filesystem must be writable from
+# code, see readme.md. Each push or drop rewrites one slot and the header.
+class FileRing:
+    path:str
+    capacity:int
+    slotSize:int
+    policy:int
+    dropped:int
+    _file:object
+    _head:int
+    _count:int
+
+    _HEADER = "<HHII" # slotSize, capacity, head, count
+    _HEADER_SIZE = 12
+
+    # slotSize includes the two byte length of each payload
+    def __init__(self, path:str, capacity:int, slotSize:int=512, policy:int=DROP_OLDEST):
+        self.path = path
+        self.capacity = capacity
+        self.slotSize = slotSize
+        self.policy = policy
+        self.dropped = 0
+        self._head = 0
+        self._count = 0
+        try:
+            self._file = open(path, "r+b")
+            header = self._file.read(self._HEADER_SIZE)
+            if len(header) == self._HEADER_SIZE:
+                size, slots, head, count = struct.unpack(self._HEADER, header)
+                if size == slotSize and slots == capacity and head < capacity and count <= capacity:
+                    self._head = head
+                    self._count = count
+                    return
+            self._file.close()
+        except OSError:
+            pass
+        self._create()
+
+    def _create(self):
+        self._file = open(self.path, "w+b")
+        self._writeHeader()
+        empty = bytes(self.slotSize)
+        for _ in range(self.capacity):
+            self._file.write(empty)
+        self._file.flush()
+
+    def _writeHeader(self):
+        self._file.seek(0)
+        self._file.write(struct.pack(self._HEADER, self.slotSize, self.capacity, self._head, self._count))
+
+    def _seekSlot(self, index:int):
+        self._file.seek(self._HEADER_SIZE + (index % self.capacity) * self.slotSize)
+
+    def close(self):
+        self._file.close()
+
+    def __len__(self)->int:
+        return self._count
+
+    # payloads that do not fit in a slot are refused and counted as dropped
+    def push(self, payload:str)->bool:
+        data = payload.encode("utf-8")
+        if len(data) + 2 > self.slotSize:
+            self.dropped += 1
+            return False
+        if self._count == self.capacity:
+            self.dropped += 1
+            if self.policy == DROP_NEWEST:
+                return False
+            self._head = (self._head + 1) % self.capacity
+            self._count -= 1
+        self._seekSlot(self._head + self._count)
+        self._file.write(struct.pack("<H", len(data)))
+        self._file.write(data)
+        self._count += 1
+        self._writeHeader()
+        self._file.flush()
+        return True
+
+    def peek(self, count:int)->list:
+        payloads = []
+        for i in range(min(count, self._count)):
+            self._seekSlot(self._head + i)
+            length = struct.unpack("<H", self._file.read(2))[0]
+            payloads.append(self._file.read(length).decode("utf-8"))
+        return payloads
+
+    def drop(self, count:int):
+        count = min(count, self._count)
+        self._head = (self._head + count) % self.capacity
+        self._count -= count
+        self._writeHeader()
+        self._file.flush()
+
+# Keeps reports that could not be published and sends them, oldest first,
+# in batches once the link is back. Delivery is at least once: a batch that
+# fails part way is resent from the first payload that was not accepted.
+# window is passed to send_batch(), see SEND_WINDOW in expresslink.py.
+class StoreAndForward:
+    el:ExpressLink
+    topicIndex:int
+    store:object
+    batchSize:int
+    window:int
+    sent:int
+
+    def __init__(self, el:ExpressLink, topicIndex:int, store, batchSize:int=8, window:int=SEND_WINDOW):
+        self.el = el
+        self.topicIndex = topicIndex
+        self.store = store
+        self.batchSize = batchSize
+        self.window = window
+        self.sent = 0
+
+    def __len__(self)->int:
+        return len(self.store)
+
+    # queue a payload, returns False when the store's drop policy refused it
+    def push(self, payload:str)->bool:
+        return self.store.push(payload)
+
+    # Send stored payloads until the store is empty or the link fails.
+    # Returns the number of payloads the module accepted.
+    def drain(self)->int:
+        sent = 0
+        while len(self.store):
+            batch = self.store.peek(self.batchSize)
+            results = self.el.send_batch(self.topicIndex, batch, self.window)
+            done = 0
+            for result in results:
+                if result is None or result in RETRY_RESULTS:
+                    # None was never written
+                    break
+                if result == 0:
+                    sent += 1
+                else:
+                    self.store.dropped += 1
+                done += 1
+            self.store.drop(done)
+            if done < len(batch):
+                break
+        self.sent += sent
+        return sent
+
+    # publish now when possible, otherwise keep the payload for later
+    def send(self, payload:str)->bool:
+        self.push(payload)
+        if not self.el._connected:
+            return False
+        self.drain()
+        return len(self.store) == 0
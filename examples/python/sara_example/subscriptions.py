@@ -0,0 +1,146 @@
+import time
+from expresslink import ExpressLink, EVENT_MSG
+from topics import TopicTable
+
+# Receives messages on subscribed topics and hands them to callbacks.
+# With the event pin wired, poll() only talks to the module when the pin
+# says an event is waiting, an idle poll() costs one pin read. Without it,
+# poll() asks with AT+GET, every minInterval seconds while messages keep
+# coming and backing off to maxInterval while the topics are quiet.
+# poll() reads at most maxPerPoll messages, so a flood of messages cannot
+# hold up the caller's loop; the rest are read on the following calls.
+class MessageDispatcher:
+    el:ExpressLink
+    topics:TopicTable
+    minInterval:float
+    maxInterval:float
+    maxPerPoll:int
+    interval:float
+    received:int
+    onOther:object
+    _callbacks:dict
+    _pending:list
+    _nextPoll:float
+    _resubscribe:bool
+    _losses:int
+
+    def __init__(self, el:ExpressLink, topics:TopicTable=None, minInterval:float=0.5, maxInterval:float=30.0, maxPerPoll:int=4):
+        self.el = el
+        self.topics = TopicTable(el) if topics is None else topics
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.maxPerPoll = maxPerPoll
+        self.interval = minInterval
+        self.received = 0
+        # called with (topic, message) for messages nobody subscribed to
+        self.onOther = None
+        self._callbacks = {}
+        self._pending = []
+        self._nextPoll = 0.0
+        self._resubscribe = False
+        self._losses = el.connectionLosses
+
+    # Subscribe to topic and call callback(topic, message) for each message.
+    # Returns the checkResponse code.
+    def subscribe(self, topic:str, callback)->int:
+        index = self.topics.slotFor(topic, pin=True)
+        if index == 0:
+            return self.topics.lastCode
+        code = self.el.checkResponse(self.el.sendCommand("AT+SUBSCRIBE" + str(index)))
+        if code == 0:
+            self._callbacks[topic] = callback
+            self.interval = self.minInterval
+        else:
+            self.topics.unpin(topic)
+        return code
+
+    def unsubscribe(self, topic:str)->int:
+        if topic not in self._callbacks:
+            return 0
+        del self._callbacks[topic]
+        self.topics.unpin(topic)
+        index = self.topics.slotFor(topic)
+        return self.el.checkResponse(self.el.sendCommand("AT+UNSUBSCRIBE" + str(index)))
+
+    # The module forgets subscriptions when the connection drops or it
+    # restarts, subscribe again once it is back.
+    def _restoreSubscriptions(self):
+        self._resubscribe = False
+        for topic in self._callbacks:
+            index = self.topics.slotFor(topic, pin=True)
+            if index == 0 or self.el.checkResponse(self.el.sendCommand("AT+SUBSCRIBE" + str(index))) != 0:
+                self._resubscribe = True
+
+    # take the MSG events out of el.events, leaving the others for the caller
+    def _collectEvents(self):
+        kept = []
+        for event in self.el.events:
+            if event[0] == EVENT_MSG:
+                if event[1] not in self._pending:
+                    self._pending.append(event[1])
+            else:
+                kept.append(event)
+        self.el.events = kept
+
+    def _dispatch(self, topic:str, message:str):
+        self.received += 1
+        callback = self._callbacks.get(topic, self.onOther)
+        if callback is not None:
+            callback(topic, message)
+
+    # read the next message on one topic slot, False when there is none
+    def _getFrom(self, index:int)->bool:
+        response = self.el.request("AT+GET" + str(index))
+        if not response.ok or not response.payload:
+            return False
+        topic = self.topics.topic(index)
+        self._dispatch(topic if topic is not None else "", response.payload)
+        return True
+
+    # read the next message on any topic, False when there is none
+    def _getAny(self)->bool:
+        response = self.el.request("AT+GET")
+        if not response.ok or not response.lines:
+            return False
+        self._dispatch(response.payload, response.lines[0])
+        return True
+
+    def _pollEvents(self)->int:
+        if self.el.eventPending():
+            self.el.serviceEvents()
+        self._collectEvents()
+        count = 0
+        while self._pending and count < self.maxPerPoll:
+            if self._getFrom(self._pending[0]):
+                count += 1
+            else:
+                self._pending.pop(0)
+        return count
+
+    def _pollAdaptive(self)->int:
+        now = time.monotonic()
+        if now < self._nextPoll:
+            return 0
+        count = 0
+        while count < self.maxPerPoll and self._getAny():
+            count += 1
+        if count:
+            self.interval = self.minInterval
+        else:
+            self.interval = min(self.maxInterval, self.interval * 2)
+        # poll again right away when the read limit cut a burst short
+        self._nextPoll = now if count == self.maxPerPoll else now + self.interval
+        return count
+
+    # Call from the main loop. Returns the number of messages dispatched.
+    def poll(self)->int:
+        if self.el.connectionLosses != self._losses:
+            self._losses = self.el.connectionLosses
+            self._resubscribe = bool(self._callbacks)
+        if self._resubscribe and self.el._connected:
+            self._restoreSubscriptions()
+        if self.el.event_pin is not None:
+            return self._pollEvents()
+        if not self._callbacks and self.onOther is None:
+            return 0
+        return self._pollAdaptive()
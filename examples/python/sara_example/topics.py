@@ -0,0 +1,124 @@
+from expresslink import ExpressLink, ERR_TOPIC_OUT_OF_RANGE
+
+MAX_TOPICS = 16
+
+# Maps topic strings onto the module's TopicN slots so code can publish by
+# topic name. The table remembers which topic is configured in which slot,
+# so AT+CONF is only sent when a topic is not in a slot already. When every
+# slot is taken, the least recently used one is reconfigured.
+# Slots first..last are managed, keep slots used elsewhere outside the range,
+# e.g. TopicTable(el, first=2) when code.py publishes on Topic1.
+# Pinned topics (subscriptions) are never evicted.
+class TopicTable:
+    el:ExpressLink
+    first:int
+    last:int
+    lastCode:int
+    configWrites:int
+    hits:int
+    _topics:dict
+    _slots:dict
+    _order:list
+    _pinned:set
+
+    def __init__(self, el:ExpressLink, first:int=1, last:int=MAX_TOPICS):
+        self.el = el
+        self.first = first
+        self.last = last
+        self.lastCode = 0
+        self.configWrites = 0
+        self.hits = 0
+        self.invalidate()
+
+    # forget every assignment, e.g. after a factory reset
+    def invalidate(self):
+        self._topics = {}
+        self._slots = {}
+        self._order = []
+        self._pinned = set()
+
+    # Read the topics already configured in the module, so a restart does not
+    # rewrite them. Costs one AT+CONF? per slot.
+    def load(self):
+        self.invalidate()
+        for index in range(self.first, self.last + 1):
+            response = self.el.request("AT+CONF? Topic" + str(index))
+            if response.ok and response.payload and response.payload not in self._slots:
+                self._assign(index, response.payload)
+
+    def _assign(self, index:int, topic:str):
+        old = self._topics.get(index)
+        if old is not None:
+            del self._slots[old]
+        self._topics[index] = topic
+        self._slots[topic] = index
+        self._touch(index)
+
+    def _touch(self, index:int):
+        if index in self._order:
+            self._order.remove(index)
+        self._order.append(index)
+
+    def _forget(self, index:int):
+        topic = self._topics.pop(index, None)
+        if topic is not None:
+            del self._slots[topic]
+        if index in self._order:
+            self._order.remove(index)
+        self._pinned.discard(index)
+
+    # a free slot, or the least recently used one that is not pinned
+    def _victim(self):
+        for index in range(self.first, self.last + 1):
+            if index not in self._topics:
+                return index
+        for index in self._order:
+            if index not in self._pinned:
+                return index
+        return None
+
+    # Return the slot holding topic, configuring one if needed. Returns 0
+    # when no slot is available or the module refused the configuration,
+    # lastCode then holds the checkResponse code (-1 when all slots are pinned).
+    def slotFor(self, topic:str, pin:bool=False)->int:
+        index = self._slots.get(topic)
+        if index is not None:
+            self.hits += 1
+        else:
+            index = self._victim()
+            if index is None:
+                self.lastCode = -1
+                return 0
+            self._forget(index)
+            self.configWrites += 1
+            self.lastCode = self.el.checkResponse(self.el.sendCommand("AT+CONF Topic" + str(index) + "=" + topic))
+            if self.lastCode != 0:
+                return 0
+            self._topics[index] = topic
+            self._slots[topic] = index
+        self._touch(index)
+        if pin:
+            self._pinned.add(index)
+        return index
+
+    def unpin(self, topic:str):
+        index = self._slots.get(topic)
+        if index is not None:
+            self._pinned.discard(index)
+
+    def topic(self, index:int):
+        return self._topics.get(index)
+
+    # Publish payload on topic with ExpressLink.publish(), so it gets the same
+    # checks. Returns the checkResponse code.
+    def publish(self, topic:str, payload)->int:
+        for _ in range(2):
+            index = self.slotFor(topic)
+            if index == 0:
+                return self.lastCode
+            code = self.el.publish(index, payload)
+            if code != ERR_TOPIC_OUT_OF_RANGE:
+                return code
+            # the slot was changed behind our back, configure it again
+            self._forget(index)
+        return code
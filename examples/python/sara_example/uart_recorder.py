@@ -0,0 +1,203 @@
+import sys
+import time
+import struct
+
+# Records UART traffic between the driver and the module, and plays it back.
+#
+#   port = RecordingPort(uart, "session.elr")
+#   el = ExpressLink(port, ...)
+#   ...
+#   port.close()
+#
+#   el = ExpressLink(ReplayPort("session.elr", speed=10.0))
+#
+#   python3 uart_recorder.py session.elr
+#
+# prints a recording. The file starts with MAGIC, followed by one record per
+# write or read: kind, microseconds since the previous record, data length,
+# then the data.
+
+MAGIC = b"ELR1"
+RECORD = "<BIH"
+RECORD_SIZE = struct.calcsize(RECORD)
+WRITE = 0
+READ = 1
+
+# Wraps the port passed to ExpressLink and logs everything written to and
+# read from it with its time. stream is a path or anything with write().
+class RecordingPort:
+    port:object
+    records:int
+    _stream:object
+    _ownStream:bool
+    _last:float
+
+    def __init__(self, port, stream):
+        self.port = port
+        self._ownStream = isinstance(stream, str)
+        self._stream = open(stream, "wb") if self._ownStream else stream
+        self._stream.write(MAGIC)
+        self.records = 0
+        self._last = time.monotonic()
+
+    def _log(self, kind:int, data):
+        now = time.monotonic()
+        delta = min(int((now - self._last) * 1000000), 0xffffffff)
+        self._last = now
+        # long data is split, the length field is 16 bits
+        start = 0
+        while True:
+            part = data[start:start + 0xffff]
+            self._stream.write(struct.pack(RECORD, kind, delta, len(part)))
+            self._stream.write(part)
+            self.records += 1
+            delta = 0
+            start += 0xffff
+            if start >= len(data):
+                break
+
+    @property
+    def in_waiting(self)->int:
+        return self.port.in_waiting
+
+    def write(self, data)->int:
+        count = self.port.write(data)
+        self._log(WRITE, data)
+        return count
+
+    def read(self, count:int=None):
+        data = self.port.read(count)
+        if data:
+            self._log(READ, data)
+        return data
+
+    def readinto(self, buf):
+        count = self.port.readinto(buf)
+        if count:
+            self._log(READ, memoryview(buf)[0:count])
+        return count
+
+    def reset_input_buffer(self):
+        self.port.reset_input_buffer()
+
+    def close(self):
+        if self._ownStream:
+            self._stream.close()
+        elif hasattr(self._stream, "flush"):
+            self._stream.flush()
+
+# Returns the records of a recording as a list of (kind, seconds since the
+# start, data).
+def load(stream)->list:
+    if isinstance(stream, str):
+        with open(stream, "rb") as f:
+            return load(f)
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a UART recording")
+    records = []
+    elapsed = 0.0
+    while True:
+        head = stream.read(RECORD_SIZE)
+        if len(head) < RECORD_SIZE:
+            break
+        kind, delta, length = struct.unpack(RECORD, head)
+        elapsed += delta / 1000000
+        records.append((kind, elapsed, stream.read(length)))
+    return records
+
+# A port that plays a recording back to the driver. Recorded reads become
+# readable once the driver has written everything that was written before
+# them, after the same delay as in the recording divided by speed. speed 0
+# makes them readable straight away. Bytes written that differ from the
+# recording are counted in mismatches.
+class ReplayPort:
+    speed:float
+    mismatches:int
+    bytesWritten:int
+    bytesRead:int
+    _records:list
+    _writeEnds:list
+    _expected:bytes
+    _next:int
+    _anchorRecorded:float
+    _anchor:float
+    _rx:bytearray
+
+    def __init__(self, recording, speed:float=1.0):
+        self.speed = speed
+        self.mismatches = 0
+        self.bytesWritten = 0
+        self.bytesRead = 0
+        self._records = recording if isinstance(recording, list) else load(recording)
+        # for each record, how much the driver must have written before it
+        self._writeEnds = []
+        total = 0
+        for kind, at, data in self._records:
+            if kind == WRITE:
+                total += len(data)
+            self._writeEnds.append(total)
+        self._expected = b"".join([data for kind, at, data in self._records if kind == WRITE])
+        self._next = 0
+        self._anchorRecorded = 0.0
+        self._anchor = time.monotonic()
+        self._rx = bytearray()
+
+    # True once every recorded read has been handed out
+    @property
+    def finished(self)->bool:
+        return self._next >= len(self._records) and not self._rx
+
+    def _release(self):
+        now = time.monotonic()
+        while self._next < len(self._records):
+            kind, at, data = self._records[self._next]
+            if kind == WRITE:
+                if self.bytesWritten < self._writeEnds[self._next]:
+                    return
+                # the driver caught up with this write, reads after it are
+                # timed from now
+                self._anchorRecorded = at
+                self._anchor = now
+            else:
+                if self.speed and now < self._anchor + (at - self._anchorRecorded) / self.speed:
+                    return
+                self._rx.extend(data)
+            self._next += 1
+
+    @property
+    def in_waiting(self)->int:
+        self._release()
+        return len(self._rx)
+
+    def write(self, data)->int:
+        data = bytes(data)
+        expected = self._expected[self.bytesWritten:self.bytesWritten + len(data)]
+        if expected != data:
+            self.mismatches += len(data) - len(expected)
+            for i in range(len(expected)):
+                if expected[i] != data[i]:
+                    self.mismatches += 1
+        self.bytesWritten += len(data)
+        self._release()
+        return len(data)
+
+    def read(self, count:int=None):
+        self._release()
+        if count is None:
+            count = len(self._rx)
+        data = bytes(self._rx[0:count])
+        del self._rx[0:count]
+        self.bytesRead += len(data)
+        return data
+
+    def readinto(self, buf):
+        data = self.read(len(buf))
+        buf[0:len(data)] = data
+        return len(data)
+
+    def reset_input_buffer(self):
+        self._rx = bytearray()
+
+if __name__ == "__main__":
+    for kind, at, data in load(sys.argv[1]):
+        print("%10.6f %s %r" % (at, "->" if kind == WRITE else "<-", bytes(data)))
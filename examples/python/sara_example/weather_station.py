@@ -1,13 +1,72 @@
 import time
+import array
+
+# Fixed size ring of floats with a running total, so adding a sample and
+# taking the mean of the last capacity samples cost the same however many
+# there are. The total is recomputed from the samples once per pass round
+# the ring, so float rounding cannot build up.
+class RingBuffer:
+    capacity:int
+    values:array.array
+    count:int
+    head:int
+    total:float
+
+    def __init__(self, capacity:int):
+        self.capacity = capacity
+        self.values = array.array("f", [0.0] * capacity)
+        self.clear()
+
+    def __len__(self)->int:
+        return self.count
+
+    def clear(self):
+        self.count = 0
+        self.head = 0
+        self.total = 0.0
+
+    def add(self, value:float):
+        if self.count == self.capacity:
+            self.total -= self.values[self.head]
+        else:
+            self.count += 1
+        self.values[self.head] = value
+        # the stored value, rounded to the array's single precision, is what
+        # gets subtracted again later
+        self.total += self.values[self.head]
+        self.head += 1
+        if self.head == self.capacity:
+            self.head = 0
+            self._resum()
+
+    def _resum(self):
+        total = 0.0
+        for i in range(self.count):
+            total += self.values[i]
+        self.total = total
+
+    # add offset to every sample
+    def shift(self, offset:float):
+        for i in range(self.count):
+            self.values[i] += offset
+        self._resum()
+
+    def mean(self)->float:
+        if self.count == 0:
+            return 0.0
+        return self.total / self.count
 
 class weather_station:
     windGust1minSpeed:float
     windGust1minDirection:float
-    windDataSpeed = []
-    windDataDirection = []
-    windGust = []
+    windDataSpeed:RingBuffer
+    windDataDirection:RingBuffer
+    windGustSpeed:array.array
+    windGustDirection:array.array
+    windGustCount:int
+    windGustHead:int
     gustDataCounter:int
-    windDataCounter:int
+    _direction:float
 
     # report this information
     windSpeed:float
@@ -21,7 +80,15 @@ class weather_station:
         print("starting weather station")
         self.windGust1minSpeed = 0.0
         self.gustDataCounter = 60
-        self.windDataCounter = 120
+        # two minutes of one second samples
+        self.windDataSpeed = RingBuffer(120)
+        self.windDataDirection = RingBuffer(120)
+        # ten one minute gusts
+        self.windGustSpeed = array.array("f", [0.0] * 10)
+        self.windGustDirection = array.array("f", [0.0] * 10)
+        self.windGustCount = 0
+        self.windGustHead = 0
+        self._direction = 0.0
         self.windGust1minDirection = 0.0
         self.windGust1minSpeed = 0.0
         self.wind2MinAverageMPH = 0.0
@@ -41,55 +108,50 @@ class weather_station:
         if self.gustDataCounter == 0:
             self.gustDataCounter = 60
             # update the 10 minute wind gust statistics every minute
-            gdata = (self.windGust1minSpeed, self.windGust1minDirection)
-            self.windGust.append( gdata )
+            self.windGustSpeed[self.windGustHead] = self.windGust1minSpeed
+            self.windGustDirection[self.windGustHead] = self.windGust1minDirection
+            self.windGustHead = (self.windGustHead + 1) % len(self.windGustSpeed)
+            if self.windGustCount < len(self.windGustSpeed):
+                self.windGustCount += 1
             self.windGust1minSpeed = 0
-            while len(self.windGust) > 10: # ensure we only have 10 minutes of data
-                self.windGust.pop(0)
-            gust = (0.0,0.0)
-            for g in self.windGust:
-                if g[0] > gust[0]:
-                    gust = g
-            self.wind10MinGustMPH = gust[0]
-            self.wind10MinGustDirection = gust[1]
+            gust = 0.0
+            gustDirection = 0.0
+            for i in range(self.windGustCount):
+                if self.windGustSpeed[i] > gust:
+                    gust = self.windGustSpeed[i]
+                    gustDirection = self.windGustDirection[i]
+            self.wind10MinGustMPH = gust
+            self.wind10MinGustDirection = gustDirection
 
+    # The 2 minute averages are kept up to date with every sample.
     def addWind(self, speed: float , direction:float):
-        self.windDataCounter -= 1
         self.windSpeed = speed
         self.windDirection = direction
-        self.windDataSpeed.append( speed )
-        self.windDataDirection.append( direction )
+        self.windDataSpeed.add( speed )
+        self.wind2MinAverageMPH = self.windDataSpeed.mean()
 
-        self._doGusts(speed,direction)
+        # Directions are averaged unwrapped, each one as the previous plus the
+        # shortest turn to it, so 350 and 10 average to 0 rather than 180.
+        if len(self.windDataDirection) == 0:
+            self._direction = direction
+        else:
+            self._direction += self._addDirection(direction, self._direction)
+        self.windDataDirection.add( self._direction )
+        if self.windDataDirection.head == 0:
+            # once per pass round the ring, bring the unwrapped directions
+            # back near 0..360 so they cannot grow without bound
+            turns = int(self.windDataDirection.mean() // 360)
+            if turns:
+                self.windDataDirection.shift(-360.0 * turns)
+                self._direction -= 360.0 * turns
+        self.wind2MinAverageDirection = self.windDataDirection.mean() % 360
 
-        if self.windDataCounter == 0:
-            self.windDataCounter = 120
-            # time to compute wind statistics (every 2 minutes)
-            self._calcWeather()
-            self.windDataDirection.clear()
-            self.windDataSpeed.clear()
+        self._doGusts(speed,direction)
 
+    # the shortest turn from direction2 to direction1, -180..180
     def _addDirection(self, direction1:float, direction2:float )->float:
-        delta = direction1 - direction2
-        if delta < -180.0:
-            return delta + 360
-        elif delta > 180.0:
+        delta = (direction1 - direction2) % 360
+        if delta > 180.0:
             return delta - 360
         else:
             return delta
-
-    def _calcWeather(self):
-        speedAverage = 0
-        for w in self.windDataSpeed:
-            speedAverage += w
-        self.wind2MinAverageMPH = speedAverage / len(self.windDataSpeed)
-        
-        sum = self.windDataDirection[0]
-        D = self.windDataDirection[0]
-        for d in self.windDataDirection[1:]:
-            D += self._addDirection(d, D)
-            sum += D
-        self.wind2MinAverageDirection = sum / len(self.windDataDirection)
-
-
-